@@ -1,15 +1,28 @@
 from argparse import ArgumentParser, ArgumentTypeError, FileType
 from itertools import permutations
+from os import cpu_count
 from pathlib import Path
 
+import sys
+
 from tkinter.messagebox import askyesno, showerror
 from tkinter.filedialog import askdirectory, askopenfilename, asksaveasfilename
 from tkinter.simpledialog import askstring
 
-from src.blueprint import get_guid_map, parse_blueprint
-from src.beamification import beamify
-from src.s_field import construct_s_field
+from src.blueprint import get_guid_map
+from src.beamification import (
+    beamify,
+    grain_coefficients,
+    layout_objective,
+    unit_layout,
+)
+from src.explore import explore_beamify, report_exploration
+from src.field_cache import prepare_blueprint
+from src.greedy import greedy_beamify
+from src.incremental import block_layout, rebeamify
+from src.symmetry import symmetric_beamify
 from src.make_result import make_bp_from_field
+from src.timing import report_timings, timed
 
 
 def ftd_dir(str_path: str):
@@ -29,6 +42,14 @@ def ftd_dir(str_path: str):
     return ftd_dir
 
 
+def blueprint_path(str_path: str):
+    path = Path(str_path)
+    if not path.is_file():
+        raise ArgumentTypeError("Blueprint does not exist")
+
+    return path
+
+
 def color_string(string):
     if not string:
         return set()
@@ -39,6 +60,30 @@ def color_string(string):
             raise ArgumentTypeError("Invalid color string")
 
 
+def time_budget(string):
+    try:
+        seconds = float(string)
+    except ValueError as e:
+        raise ArgumentTypeError("Invalid time budget") from e
+
+    if seconds <= 0:
+        raise ArgumentTypeError("Time budget must be positive")
+
+    return seconds
+
+
+def worker_count(string):
+    try:
+        workers = int(string)
+    except ValueError as e:
+        raise ArgumentTypeError("Invalid worker count") from e
+
+    if workers < 1:
+        raise ArgumentTypeError("Worker count must be at least 1")
+
+    return workers
+
+
 if __name__ == "__main__":
     main_parser = ArgumentParser("Beamify script")
     subs = main_parser.add_subparsers(title="Modes", dest="mode")
@@ -67,6 +112,44 @@ if __name__ == "__main__":
         type=color_string,
         help="Comma-separated string of colors of blocks we won't touch",
     )
+    cache_group = cli_parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read nor write the cached FtD item database",
+    )
+    cache_group.add_argument(
+        "--rebuild-cache",
+        action="store_true",
+        help="Rescan FtD item files even if the cached item database is up to date",
+    )
+    cli_parser.add_argument(
+        "--no-solution-cache",
+        action="store_true",
+        help="Solve every armor blob from scratch instead of reusing layouts of identical blobs solved before",
+    )
+    cli_parser.add_argument(
+        "--no-field-cache",
+        action="store_true",
+        help="Parse blueprints from scratch instead of loading them as prepared by an earlier run",
+    )
+    cli_parser.add_argument(
+        "--scan-workers",
+        default=8,
+        type=worker_count,
+        help="Number of threads reading FtD item files when the item cache is cold",
+    )
+    cli_parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print how long each phase took to stderr",
+    )
+    cli_parser.add_argument(
+        "--workers",
+        default=1,
+        type=worker_count,
+        help="Number of processes used to solve independent armor blobs in parallel",
+    )
 
     cli_subparsers = cli_parser.add_subparsers(title="Procedures", dest="procedure")
     cli_parser_beamify = cli_subparsers.add_parser(
@@ -93,6 +176,42 @@ if __name__ == "__main__":
         action="store_true",
         help="If specified, we'll not touch beams that are already 4m long.",
     )
+    cli_parser_beamify.add_argument(
+        "--engine",
+        choices=["milp", "greedy"],
+        default="milp",
+        help="`milp` solves for the best layout. `greedy` is a fast heuristic for crafts too big to solve in reasonable time.",
+    )
+    cli_parser_beamify.add_argument(
+        "--lanes",
+        action="store_true",
+        help="First tile straight runs along the primary grain axis exactly, leaving the MILP less to solve. Faster, but the layout can be worse",
+    )
+    cli_parser_beamify.add_argument(
+        "--time-budget",
+        type=time_budget,
+        help="Seconds the MILP may take overall. Blob sizes and per-blob time limits are then picked from solve times predicted from past runs",
+    )
+    cli_parser_beamify.add_argument(
+        "--symmetry",
+        action="store_true",
+        help="If the craft is mirror-symmetric left to right, solve only its left half and mirror the beams onto the right half",
+    )
+    cli_parser_beamify.add_argument(
+        "--previous",
+        type=blueprint_path,
+        help="Beamified blueprint of an earlier version of this craft. Its beams are kept wherever the craft didn't change, and only the rest is beamified",
+    )
+    cli_parser_beamify.add_argument(
+        "--explore",
+        action="store_true",
+        help="Beamify for every grain and bias at once, print how they compare to stderr and save the one picked by --grain and --bias",
+    )
+    cli_parser_beamify.add_argument(
+        "--compare",
+        action="store_true",
+        help="Also run the other engine and print the objective of both layouts to stderr",
+    )
     cli_parser_debeamify = cli_subparsers.add_parser(
         "debeamify", help="Convert all eligible armor blocks into 1m variants"
     )
@@ -103,17 +222,49 @@ if __name__ == "__main__":
         bp_path = Path(args.input.name)
         output = args.output
         excluded_colors = args.exclude_colors
+        workers = args.workers
+        use_cache = not args.no_cache
+        rebuild_cache = args.rebuild_cache
+        use_solution_cache = not args.no_solution_cache
+        use_field_cache = not args.no_field_cache
+        scan_workers = args.scan_workers
+        show_timings = args.timings
 
-        debeamify = args.procedure == "beamify"
+        debeamify = args.procedure == "debeamify"
 
         if args.procedure == "beamify":
+            if args.explore and (
+                args.engine == "greedy"
+                or args.lanes
+                or args.symmetry
+                or args.previous is not None
+                or args.time_budget is not None
+            ):
+                cli_parser_beamify.error(
+                    "--explore can't be combined with --engine greedy, --lanes, --symmetry, --previous or --time-budget"
+                )
+
             grain = args.grain
             bias = args.bias
             do_exclude_4m = args.exclude_4m_beams
+            engine = args.engine
+            compare_engines = args.compare
+            lanes = args.lanes
+            solve_time_budget = args.time_budget
+            symmetry = args.symmetry
+            previous_bp_path = args.previous
+            explore = args.explore
         elif args.procedure == "debeamify":
             grain = "xyz"
             bias = "random"
             do_exclude_4m = False
+            engine = "debeamify"
+            compare_engines = False
+            lanes = False
+            solve_time_budget = None
+            symmetry = False
+            previous_bp_path = None
+            explore = False
         else:
             raise NotImplemented
 
@@ -236,6 +387,21 @@ if __name__ == "__main__":
             showerror(message="Invalid color exclusion string")
             exit()
 
+        workers = cpu_count() or 1
+        use_cache = True
+        rebuild_cache = False
+        use_solution_cache = True
+        use_field_cache = True
+        scan_workers = 8
+        show_timings = False
+        engine = "debeamify" if debeamify else "milp"
+        compare_engines = False
+        lanes = False
+        solve_time_budget = None
+        symmetry = False
+        previous_bp_path = None
+        explore = False
+
         with open("./path_defaults", "w") as path_defaults:
             path_defaults.writelines(
                 [
@@ -245,18 +411,89 @@ if __name__ == "__main__":
                 ]
             )
 
-    guid_map = get_guid_map(ftd)
+    timings = {}
+    guid_map = get_guid_map(
+        ftd,
+        use_cache=use_cache,
+        rebuild_cache=rebuild_cache,
+        scan_workers=scan_workers,
+        timings=timings,
+    )
 
-    bp, blocks, color_map = parse_blueprint(
+    bp, blocks, color_map, s_field, segments = prepare_blueprint(
         bp_path,
         guid_map,
-        with_subconstructs=False,
+        do_exclude_4m,
+        excluded_colors,
+        use_cache=use_field_cache,
+        timings=timings,
     )
 
-    s_field = construct_s_field(blocks, do_exclude_4m, excluded_colors)
-    result = beamify(
-        s_field=s_field, grain_directions=grain, bias_type=bias, debeamify=debeamify
-    )
-    output.write(
-        make_bp_from_field(field=result, guid_map=guid_map, blocks=blocks, og_bp=bp)
-    )
+    if previous_bp_path is not None:
+        with timed(timings, "previous blueprint parse"):
+            _, previous_blocks, _, previous_s_field, _ = prepare_blueprint(
+                previous_bp_path,
+                guid_map,
+                do_exclude_4m,
+                excluded_colors,
+                use_cache=use_field_cache,
+            )
+            previous_layout = block_layout(previous_blocks, previous_s_field)
+
+    mip_gaps = []
+
+    def run_engine(engine, s_field=s_field):
+        with timed(timings, f"beamification ({engine})"):
+            if engine == "debeamify":
+                return unit_layout(s_field)
+            if engine == "greedy":
+                return greedy_beamify(s_field, grain_directions=grain)
+            return (symmetric_beamify if symmetry else beamify)(
+                s_field=s_field,
+                grain_directions=grain,
+                bias_type=bias,
+                debeamify=debeamify,
+                workers=workers,
+                lanes=lanes,
+                mip_gaps=mip_gaps,
+                time_budget=solve_time_budget,
+                use_solution_cache=use_solution_cache,
+                segments=segments,
+            )
+
+    if explore:
+        with timed(timings, "beamification (explore)"):
+            layouts = explore_beamify(s_field, workers=workers, segments=segments)
+        report_exploration(s_field, layouts, (grain, bias))
+        result = layouts[grain, bias]
+    elif previous_bp_path is not None:
+        result = rebeamify(
+            s_field,
+            previous_s_field,
+            previous_layout,
+            lambda rest: run_engine(engine, rest),
+        )
+    else:
+        result = run_engine(engine)
+    if compare_engines:
+        other_engine = "greedy" if engine == "milp" else "milp"
+        layouts = {engine: result, other_engine: run_engine(other_engine)}
+        coeffs = grain_coefficients(grain)
+        for name, layout in layouts.items():
+            objective = layout_objective(s_field, layout, coeffs, bias)
+            print(f"{name} objective: {objective:.2f}", file=sys.stderr)
+
+    if mip_gaps:
+        print(
+            f"{len(mip_gaps)} blobs hit the solver time limit, "
+            f"worst MIP gap {max(mip_gaps):.1%}",
+            file=sys.stderr,
+        )
+
+    with timed(timings, "blueprint write"):
+        make_bp_from_field(
+            field=result, guid_map=guid_map, blocks=blocks, og_bp=bp, output=output
+        )
+
+    if show_timings:
+        report_timings(timings)
@@ -1,310 +1,866 @@
-from threading import Event
-from typing import Literal, Tuple
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 
-from scipy.cluster.vq import kmeans2
-from scipy.ndimage import value_indices
 from scipy.optimize import Bounds, LinearConstraint, milp
 from scipy.sparse import coo_array
+from scipy.sparse.csgraph import connected_components
 
 import numpy as np
 import numpy.typing as npt
 
-BIAS_TYPES = Literal["random"] | Literal["sided"] | Literal["alternate"]
+from .coefficients import BIAS_TYPES, blob_coefficients, grain_coefficients
+from .lanes import solve_lanes
+from .s_field import SegmentIndex, index_armor_segments
+from .scheduler import DEFAULT_TIME_LIMIT, SolveScheduler
+from .solution_cache import SolutionCache, open_solution_cache
+from .voxel_field import VoxelField
+
+
+# 10 configurations
+# 1m,
+# 2m right, 3m right, 4m right
+# 2m down, 3m down, 4m down
+# 2m forward, 3m forward, 4m forward
+CONFIGURATION_AXES = np.array([0, 0, 0, 0, 1, 1, 1, 2, 2, 2])
+CONFIGURATION_LENGTHS = np.array([1, 2, 3, 4, 2, 3, 4, 2, 3, 4])
+
+# Whether the layout is proven optimal, chosen variable indices (None if no
+# feasible layout was found), the MIP gap left when the solver stopped and
+# how many seconds solving took
+BlobSolution = Tuple[bool, Optional[npt.NDArray], float, float]
+
+
+def blob_key_index(blob: npt.NDArray, padding=3):
+    """Linear keys of blob voxels in their padded bounding box, the key strides
+    and a lookup from keys back to voxel indices (-1 where there is no voxel).
+
+    The padding guarantees that shifts of up to `padding` voxels never wrap."""
+    local = blob - blob.min(axis=0) + padding
+    dims = local.max(axis=0) + padding + 1
+    strides = np.array([dims[1] * dims[2], dims[2], 1])
+    keys = local @ strides
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    def voxels_at(shifted_keys):
+        found_at = np.minimum(np.searchsorted(sorted_keys, shifted_keys), len(blob) - 1)
+        return np.where(sorted_keys[found_at] == shifted_keys, order[found_at], -1)
+
+    return keys, strides, voxels_at
+
+
+def connected_groups(points: npt.NDArray) -> List[npt.NDArray]:
+    """Split points into 6-connected components, as arrays of row indices"""
+    keys, strides, voxels_at = blob_key_index(points, padding=1)
+
+    rows, cols = [], []
+    for stride in strides:
+        neighbours = voxels_at(keys + stride)
+        connected = np.flatnonzero(neighbours >= 0)
+        rows.append(connected)
+        cols.append(neighbours[connected])
+
+    rows = np.concatenate(rows)
+    graph = coo_array(
+        (np.ones(len(rows), dtype=bool), (rows, np.concatenate(cols))),
+        (len(points), len(points)),
+    )
+    component_count, labels = connected_components(graph, directed=False)
+    if component_count == 1:
+        return [np.arange(len(points))]
+
+    order = np.argsort(labels, kind="stable")
+    starts = np.searchsorted(labels[order], np.arange(1, component_count))
+    return np.split(order, starts)
+
+
+def segment_components(
+    s_field: VoxelField, segments: SegmentIndex
+) -> List[npt.NDArray]:
+    """Voxel indices of every 6-connected piece of every segment"""
+    coords = s_field.coords
+    return [
+        voxels[group]
+        for voxels in segments.values()
+        for group in connected_groups(coords[voxels])
+    ]
+
+
+def pack_components(
+    s_field: VoxelField, components: List[npt.NDArray], max_size: int
+) -> List[npt.NDArray]:
+    """Gather components into packs of at most `max_size` voxels, bigger ones
+    being packed on their own.
+
+    Only pieces of the same segment share a pack. Those never touch, so the model
+    of a pack is block-diagonal, and solving it gives every piece the layout it
+    would get on its own.
+    """
+    packs = []
+    open_packs: Dict[int, Tuple[List[npt.NDArray], int]] = {}
+    for voxels in components:
+        segment_id = int(s_field.values[voxels[0]])
+        pack, size = open_packs.get(segment_id, ([], 0))
+        if pack and size + len(voxels) > max_size:
+            packs.append(np.concatenate(pack))
+            pack, size = [], 0
+        pack.append(voxels)
+        open_packs[segment_id] = pack, size + len(voxels)
+
+    packs.extend(np.concatenate(pack) for pack, _ in open_packs.values())
+    return packs
+
+
+# Voxels this far on either side of a partition cut get re-solved together
+STITCH_BAND_WIDTH = 4
+
+
+def choose_cut(points: npt.NDArray, grain_axis: int) -> Tuple[int, int]:
+    """Pick a plane splitting `points` roughly in half, across their widest axis.
+
+    Cuts across the grain axis snap to multiples of 4 where they can, so
+    grain-aligned 4m beams laid out on that lattice never straddle them.
+    """
+    extents = np.ptp(points, axis=0)
+    for axis in np.argsort(-extents, kind="stable"):
+        coords = points[:, axis]
+        low, high = coords.min(), coords.max()
+        median = np.median(coords)
+        # Even with most points at one end, a cut at the median splits off some
+        median_cut = np.clip(np.ceil(median), low + 1, high)
+
+        if axis == grain_axis:
+            candidates = np.append(
+                4 * (np.round(median / 4) + np.array([0, 1, -1])), median_cut
+            )
+        else:
+            candidates = np.array([median_cut])
+        candidates = candidates[(candidates > low) & (candidates <= high)]
 
+        if len(candidates):
+            return int(axis), int(candidates[0])
 
-def beamify_procedure(
-    s_field: npt.NDArray,
-    coeffs: Tuple[float, float, float, float, float, float, float, float, float, float],
-    blob_size_threshold=4000,
-    failed_solutions_signal=None,
-    bias_type: BIAS_TYPES = "random",
-    debeamify=False,
+    # Only a single distinct point would get here, and that never needs a cut
+    raise ValueError("Cannot split a single voxel")
+
+
+def partition_blob(
+    points: npt.NDArray, max_size: int, grain_axis: int, depth=0
+) -> Tuple[List[npt.NDArray], List[Tuple[int, npt.NDArray]]]:
+    """Deterministically split points into blobs of at most `max_size` voxels.
+
+    Also returns, for every cut made, its depth in the bisection tree and the
+    points within `STITCH_BAND_WIDTH` of it.
+    """
+    if len(points) <= max_size:
+        return [points], []
+
+    axis, position = choose_cut(points, grain_axis)
+    below = points[:, axis] < position
+    in_band = np.abs(points[:, axis] - position + 0.5) < STITCH_BAND_WIDTH
+
+    blobs_below, cuts_below = partition_blob(
+        points[below], max_size, grain_axis, depth + 1
+    )
+    blobs_above, cuts_above = partition_blob(
+        points[~below], max_size, grain_axis, depth + 1
+    )
+
+    return (
+        blobs_below + blobs_above,
+        [(depth, points[in_band])] + cuts_below + cuts_above,
+    )
+
+
+def stitch_cuts(
+    result: VoxelField,
+    cuts: List[Tuple[int, npt.NDArray]],
+    counter: int,
+    max_size: int,
+    grain_axis: int,
+    executor: Optional[Executor] = None,
+    **kwargs,
 ):
-    blobs = []
+    """Re-solve every cut's band together with all beams touching it.
+
+    Deeper cuts go first. Cuts at the same depth live in disjoint regions, and so
+    do the beams touching them, so each depth is solved as one parallel batch.
+    Bands are kept within `max_size` voxels by `stitch_bands`.
+    """
+    for depth in sorted({depth for depth, _ in cuts}, reverse=True):
+        bands = [band for cut_depth, band in cuts if cut_depth == depth]
+        while bands:
+            bands, counter = stitch_bands(
+                result, bands, counter, max_size, grain_axis, executor, **kwargs
+            )
 
-    armor_segments = {*s_field.flat} - {0}
-    for armor_segment_id in armor_segments:
-        armor_mask = s_field == armor_segment_id
-        points = np.argwhere(armor_mask)
+    return counter
+
+
+def stitch_bands(
+    result: VoxelField,
+    bands: List[npt.NDArray],
+    counter: int,
+    max_size: int,
+    grain_axis: int,
+    executor: Optional[Executor] = None,
+    **kwargs,
+) -> Tuple[List[npt.NDArray], int]:
+    """Re-solve every band together with all beams touching it.
+
+    A band only replaces its beams if its solve is proven optimal, which never
+    worsens the objective since the old beams are a feasible solution of it.
+    Bands whose beams overlap are solved in separate batches. A band freeing
+    more than `max_size` voxels is split in halves, which are solved instead.
+
+    Returns the bands between those halves, which are left to stitch, and the
+    next free beam label.
+    """
+    seams = []
+    while bands:
+        beams = result.value_indices()
+        coords = result.coords
+
+        taken = np.zeros(len(result), dtype=bool)
+        freed_voxels = []
+        later_bands = []
+        for band in bands:
+            band_voxels = result.index_of(band)
+            labels = np.unique(result.values[band_voxels])
+            voxels = np.unique(
+                np.concatenate(
+                    [band_voxels, *(beams[label] for label in labels if label)]
+                )
+            )
 
-        cluster_needed = int(np.ceil(len(points) / blob_size_threshold))
-        if debeamify or cluster_needed <= 1:
-            blobs.append(points)
-            continue
+            if len(voxels) > max_size and len(band) > 1:
+                halves, halves_cuts = partition_blob(
+                    band, (len(band) + 1) // 2, grain_axis
+                )
+                later_bands.extend(halves)
+                # Halves of a thin band can make a seam as big as the band itself
+                seams.extend(seam for _, seam in halves_cuts if len(seam) < len(band))
+            elif taken[voxels].any():
+                later_bands.append(band)
+            else:
+                taken[voxels] = True
+                freed_voxels.append(voxels)
+
+        freed_blobs = [coords[voxels] for voxels in freed_voxels]
+        solutions = solve_blobs(freed_blobs, executor, **kwargs)
+        for voxels, blob, (optimal, chosen, *_) in zip(
+            freed_voxels, freed_blobs, solutions
+        ):
+            if optimal:
+                result.values[voxels] = 0
+                counter = place_beams(result, blob, chosen, counter)
+
+        bands = later_bands
+
+    return seams, counter
+
+
+def beam_fits(keys, strides, voxels_at) -> npt.NDArray:
+    """Which of the 10 configurations fit inside the blob, for every voxel"""
+    fits = np.zeros((len(keys), 10), dtype=bool)
+    fits[:, 0] = True
+
+    # Beam acceptance tests
+    for axis in range(3):
+        first_configuration = 1 + 3 * axis
+        fits_so_far = np.ones(len(keys), dtype=bool)
+        for offset in range(1, 4):
+            fits_so_far &= voxels_at(keys + offset * strides[axis]) >= 0
+            fits[:, first_configuration + offset - 1] = fits_so_far
+
+    return fits
+
+
+def blob_model_statistics(blob: npt.NDArray) -> npt.NDArray:
+    """Voxels, free variables, nonzeros of their columns and bounding box fill of
+    the model of a blob. These are what its solve time is predicted from."""
+    keys, strides, voxels_at = blob_key_index(blob)
+    fits = beam_fits(keys, strides, voxels_at)
+
+    return np.array(
+        [
+            len(blob),
+            np.count_nonzero(fits),
+            fits.sum(axis=0) @ CONFIGURATION_LENGTHS,
+            len(blob) / np.prod(np.ptp(blob, axis=0) + 1),
+        ],
+        dtype=float,
+    )
 
-        _, blob_ids = kmeans2(points.astype(float), cluster_needed, check_finite=False)
-        blobs_discovered = {}
-        for blob_id, point in zip(blob_ids, points):
-            if blob_id not in blobs_discovered:
-                blobs_discovered[blob_id] = []
-            blobs_discovered[blob_id].append(point)
 
-        for blob in blobs_discovered.values():
-            blobs.append(np.array(blob))
+def build_blob_model(blob: npt.NDArray):
+    size = len(blob)
+    voxels = np.arange(size)
+
+    keys, strides, voxels_at = blob_key_index(blob)
+    fits = beam_fits(keys, strides, voxels_at)
+
+    rows = [voxels]
+    cols = [10 * voxels]
+    for axis in range(3):
+        first_configuration = 1 + 3 * axis
+        step = strides[axis]
+
+        # Cover tests: beams starting `offset` voxels behind us, if long enough
+        for offset in range(1, 4):
+            origins = voxels_at(keys - offset * step)
+            covered = np.flatnonzero(origins >= 0)
+            for configuration in range(
+                first_configuration + offset - 1, first_configuration + 3
+            ):
+                rows.append(covered)
+                cols.append(10 * origins[covered] + configuration)
+
+    owners, configurations = np.nonzero(fits[:, 1:])
+    rows.insert(1, owners)
+    cols.insert(1, 10 * owners + configurations + 1)
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+
+    bounds = Bounds(0, fits.ravel())  # type: ignore
+
+    constraint = LinearConstraint(
+        coo_array(
+            (np.ones(len(rows), dtype=np.int64), (rows, cols)),
+            (size, 10 * size),
+        ),
+        1,
+        1,
+    )
 
-    blobs = sorted(blobs, key=lambda blob: len(blob))
+    return bounds, constraint
 
-    counter = 1
-    result = np.zeros_like(s_field)
-    for blob in tqdm(blobs):
-        coords_set = {tuple(coord): i for i, coord in enumerate(blob)}
-        size = len(blob)
-
-        configuration_data = []
-        configuration_coords = []
-        boundaries = []
-
-        # 10 configurations
-        # 1m,
-        # 2m right, 3m right, 4m right
-        # 2m down, 3m down, 4m down
-        # 2m forward, 3m forward, 4m forward
-        for i, (x, y, z) in enumerate(blob):
-            added = []
-
-            # Beam acceptance tests
-            boundaries.append(True)
-            added.append((i, 10 * i + 0))
-
-            fits_2 = not debeamify and (x + 1, y, z) in coords_set
-            fits_3 = not debeamify and fits_2 and (x + 2, y, z) in coords_set
-            fits_4 = not debeamify and fits_3 and (x + 3, y, z) in coords_set
-            boundaries.append(fits_2)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 1))
-            boundaries.append(fits_3)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 2))
-            boundaries.append(fits_4)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 3))
-
-            fits_2 = not debeamify and (x, y + 1, z) in coords_set
-            fits_3 = not debeamify and fits_2 and (x, y + 2, z) in coords_set
-            fits_4 = not debeamify and fits_3 and (x, y + 3, z) in coords_set
-            boundaries.append(fits_2)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 4))
-            boundaries.append(fits_3)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 5))
-            boundaries.append(fits_4)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 6))
-
-            fits_2 = not debeamify and (x, y, z + 1) in coords_set
-            fits_3 = not debeamify and fits_2 and (x, y, z + 2) in coords_set
-            fits_4 = not debeamify and fits_3 and (x, y, z + 3) in coords_set
-            boundaries.append(fits_2)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 7))
-            boundaries.append(fits_3)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 8))
-            boundaries.append(fits_4)
-            if boundaries[-1]:
-                added.append((i, 10 * i + 9))
-
-            # Cover tests
-            if (j := coords_set.get((x - 1, y, z))) is not None:
-                added.append((i, 10 * j + 1))
-                added.append((i, 10 * j + 2))
-                added.append((i, 10 * j + 3))
-            if (j := coords_set.get((x, y - 1, z))) is not None:
-                added.append((i, 10 * j + 4))
-                added.append((i, 10 * j + 5))
-                added.append((i, 10 * j + 6))
-            if (j := coords_set.get((x, y, z - 1))) is not None:
-                added.append((i, 10 * j + 7))
-                added.append((i, 10 * j + 8))
-                added.append((i, 10 * j + 9))
-
-            if (j := coords_set.get((x - 2, y, z))) is not None:
-                added.append((i, 10 * j + 2))
-                added.append((i, 10 * j + 3))
-            if (j := coords_set.get((x, y - 2, z))) is not None:
-                added.append((i, 10 * j + 5))
-                added.append((i, 10 * j + 6))
-            if (j := coords_set.get((x, y, z - 2))) is not None:
-                added.append((i, 10 * j + 8))
-                added.append((i, 10 * j + 9))
-
-            if (j := coords_set.get((x - 3, y, z))) is not None:
-                added.append((i, 10 * j + 3))
-            if (j := coords_set.get((x, y - 3, z))) is not None:
-                added.append((i, 10 * j + 6))
-            if (j := coords_set.get((x, y, z - 3))) is not None:
-                added.append((i, 10 * j + 9))
-
-            configuration_coords.extend(added)
-            configuration_data.extend([1] * len(added))
-
-        bounds = Bounds(0, boundaries)  # type: ignore
-
-        constraint = LinearConstraint(
-            coo_array(
-                (np.array(configuration_data), np.array(configuration_coords).T),
-                (size, 10 * size),
+
+def place_beams(result: VoxelField, blob: npt.NDArray, chosen: npt.NDArray, counter=1):
+    coord_indx, configuration = np.divmod(chosen, 10)
+
+    lengths = CONFIGURATION_LENGTHS[configuration]
+    labels = np.repeat(np.arange(counter, counter + len(chosen)), lengths)
+    steps = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    cells = np.repeat(blob[coord_indx], lengths, axis=0)
+    axes = np.repeat(CONFIGURATION_AXES[configuration], lengths)
+    cells[np.arange(len(cells)), axes] += steps
+    result.values[result.index_of(cells)] = labels
+
+    return counter + len(chosen)
+
+
+def solve_blob(
+    blob: npt.NDArray,
+    coeffs: Tuple[float, float, float, float, float, float, float, float, float, float],
+    field_shape: Tuple[int, int, int],
+    bias_type: BIAS_TYPES = "random",
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> BlobSolution:
+    bounds, constraint = build_blob_model(blob)
+    my_coeffs = blob_coefficients(blob, coeffs, field_shape, bias_type)
+
+    return solve_model(my_coeffs, bounds, constraint, time_limit)
+
+
+def solve_blob_variants(
+    blob: npt.NDArray,
+    variants: List[Tuple[npt.NDArray, BIAS_TYPES]],
+    field_shape: Tuple[int, int, int],
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> List[BlobSolution]:
+    """Solve a blob for several objectives, given as coefficients and bias type.
+
+    Only the objective differs between them, so the model is built just once.
+    """
+    bounds, constraint = build_blob_model(blob)
+    return [
+        solve_model(
+            blob_coefficients(blob, coeffs, field_shape, bias_type),
+            bounds,
+            constraint,
+            time_limit,
+        )
+        for coeffs, bias_type in variants
+    ]
+
+
+def solve_model(
+    objective: npt.NDArray,
+    bounds: Bounds,
+    constraint: LinearConstraint,
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> BlobSolution:
+    start = perf_counter()
+    solution = milp(
+        objective,
+        integrality=1,
+        bounds=bounds,
+        constraints=constraint,
+        options={"presolve": False, "time_limit": time_limit},
+    )
+    seconds = perf_counter() - start
+
+    if solution.x is None:
+        return False, None, np.inf, seconds
+    # Only the chosen variable indices travel back from the workers.
+    # A time limited solve still returns its best feasible layout so far
+    return (
+        solution.success,
+        np.flatnonzero(np.round(solution.x)),
+        0.0 if solution.success else float(solution.mip_gap),
+        seconds,
+    )
+
+
+def solve_shared_blob(
+    shm_name: str, total_points: int, start: int, end: int, solver=solve_blob, **kwargs
+):
+    shm = SharedMemory(name=shm_name)
+    try:
+        points = np.ndarray((total_points, 3), dtype=np.int64, buffer=shm.buf)
+        blob = points[start:end].copy()
+        del points
+    finally:
+        shm.close()
+
+    return solver(blob, **kwargs)
+
+
+def solve_blobs(
+    blobs: List[npt.NDArray],
+    executor: Optional[Executor] = None,
+    scheduler: Optional[SolveScheduler] = None,
+    solution_cache: Optional[SolutionCache] = None,
+    **kwargs,
+) -> Iterator[BlobSolution]:
+    """Solve blobs, yielding their solutions in the same order as `blobs`.
+
+    Blobs found in `solution_cache` skip the solver, and every proven optimal
+    layout found is added to it.
+    """
+    if solution_cache is None:
+        yield from solve_scheduled_blobs(blobs, executor, scheduler, **kwargs)
+        return
+
+    keys = [
+        solution_cache.key(
+            blob,
+            blob_coefficients(
+                blob, kwargs["coeffs"], kwargs["field_shape"], kwargs["bias_type"]
             ),
-            1,
-            1,
+        )
+        for blob in blobs
+    ]
+    cached = [solution_cache.get(*key) for key in keys]
+
+    solutions = solve_scheduled_blobs(
+        [blob for blob, chosen in zip(blobs, cached) if chosen is None],
+        executor,
+        scheduler,
+        **kwargs,
+    )
+    for key, chosen in zip(keys, cached):
+        if chosen is not None:
+            yield True, chosen, 0.0, 0.0
+            continue
+
+        solution = next(solutions)
+        optimal, chosen, _, _ = solution
+        if optimal:
+            solution_cache.put(*key, chosen)
+        yield solution
+
+
+def solve_scheduled_blobs(
+    blobs: List[npt.NDArray],
+    executor: Optional[Executor] = None,
+    scheduler: Optional[SolveScheduler] = None,
+    **kwargs,
+) -> Iterator[BlobSolution]:
+    """Solve blobs in order. A `scheduler` gives every blob its own time limit,
+    and learns from how long the blobs solved to optimality took."""
+    if scheduler is None or not blobs:
+        yield from solve_blobs_within(blobs, None, executor, **kwargs)
+        return
+
+    stats = np.array([blob_model_statistics(blob) for blob in blobs])
+    solutions = solve_blobs_within(
+        blobs, scheduler.time_limits(stats), executor, **kwargs
+    )
+    for blob_stats, solution in zip(stats, solutions):
+        optimal, _, _, seconds = solution
+        if optimal:
+            scheduler.record(blob_stats, seconds)
+        yield solution
+
+
+def solve_blobs_within(
+    blobs: List[npt.NDArray],
+    time_limits: Optional[npt.NDArray],
+    executor: Optional[Executor] = None,
+    solver=solve_blob,
+    **kwargs,
+) -> Iterator[BlobSolution]:
+    """Iterate over what `solver` returns for every blob, in the same order as
+    `blobs`. With an `executor`, every blob is submitted right away."""
+    if time_limits is None:
+        time_limits = np.full(len(blobs), DEFAULT_TIME_LIMIT)
+
+    if executor is None:
+        return (
+            solver(blob, time_limit=float(time_limit), **kwargs)
+            for blob, time_limit in zip(blobs, time_limits)
         )
 
-        adjusted_coefficients = []
-
-        for x, y, z in blob:
-            x_c = x / s_field.shape[0] if bias_type != "random" else 0
-            y_c = y / s_field.shape[1] if bias_type != "random" else 0
-            z_c = z / s_field.shape[2] if bias_type != "random" else 0
-
-            if bias_type == "alternate":
-                if y % 2 == 0 or z % 2 == 0:
-                    x_c = 1 - x_c
-                if x % 2 == 0 or z % 2 == 0:
-                    y_c = 1 - y_c
-                if x % 2 == 0 or y % 2 == 0:
-                    z_c = 1 - z_c
-
-            adjusted_coefficients.append(coeffs[0])
-            # We add a tiny constant bias to
-            #   tie-break out-of-grain selections, making them more consistent
-            adjusted_coefficients.extend(
-                coeff + x_c / 1000 + 1e-4 for coeff in coeffs[1:4]
-            )
-            adjusted_coefficients.extend(
-                coeff + y_c / 1000 + 2e-4 for coeff in coeffs[4:7]
+    offsets = np.cumsum([0, *map(len, blobs)])
+    total_points = int(offsets[-1])
+
+    # Workers read their blob out of shared memory instead of getting a pickled copy
+    shm = SharedMemory(create=True, size=max(total_points * 3 * 8, 1))
+    try:
+        if blobs:
+            points = np.ndarray((total_points, 3), dtype=np.int64, buffer=shm.buf)
+            points[:] = np.concatenate(blobs)
+            del points
+
+        task = partial(
+            solve_shared_blob, shm.name, total_points, solver=solver, **kwargs
+        )
+        # Blobs are sorted by size, so submit the biggest ones first to balance the pool
+        futures = [
+            executor.submit(
+                task,
+                int(offsets[i]),
+                int(offsets[i + 1]),
+                time_limit=float(time_limits[i]),
             )
-            adjusted_coefficients.extend(
-                coeff + z_c / 1000 + 3e-4 for coeff in coeffs[7:10]
+            for i in reversed(range(len(blobs)))
+        ]
+        futures.reverse()
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+    return collect_results(futures, shm)
+
+
+def collect_results(futures: List[Future], shm: SharedMemory) -> Iterator:
+    """Results of `futures` in order, releasing `shm` once they're all in"""
+    try:
+        for future in futures:
+            yield future.result()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def solve_with_resplits(
+    blobs: List[npt.NDArray],
+    cuts: List[Tuple[int, npt.NDArray]],
+    grain_axis: int,
+    solve: Callable[[List[npt.NDArray]], Iterable],
+    place: Callable[[npt.NDArray, Any], bool],
+):
+    """Solve `blobs`, trying blobs without a layout again in halves.
+
+    `solve` iterates over the solutions of a list of blobs, in order, and `place`
+    lays out a blob's solution, returning whether it had a layout to lay out.
+    Cuts between halves are added to `cuts`, to be stitched.
+    """
+    progress = tqdm(total=len(blobs))
+    while blobs:
+        blobs = sorted(blobs, key=lambda blob: len(blob))
+        split_blobs = []
+        # New cuts lie within single blobs, so they get stitched before older ones
+        depth = 1 + max((cut_depth for cut_depth, _ in cuts), default=-1)
+
+        for blob, solution in zip(blobs, solve(blobs)):
+            progress.update()
+            if place(blob, solution):
+                continue
+
+            # Nothing feasible was found in time, so try again in halves
+            halves, halves_cuts = partition_blob(
+                blob, (len(blob) + 1) // 2, grain_axis, depth
             )
+            split_blobs.extend(halves)
+            cuts.extend(halves_cuts)
+            progress.total += len(halves)
 
-        my_coeffs = np.array(adjusted_coefficients)
+        blobs = split_blobs
+    progress.close()
 
-        solution = milp(
-            my_coeffs,
-            integrality=1,
-            bounds=bounds,
-            constraints=constraint,
-            options={"presolve": False, "time_limit": 15},
-        )
 
-        if not solution.success and failed_solutions_signal is not None:
-            failed_solutions_signal.set()
+def beamify_procedure(
+    s_field: VoxelField,
+    coeffs: Tuple[float, float, float, float, float, float, float, float, float, float],
+    blob_size_threshold=4000,
+    unproven: Optional[npt.NDArray] = None,
+    bias_type: BIAS_TYPES = "random",
+    executor: Optional[Executor] = None,
+    segments: Optional[SegmentIndex] = None,
+    grain_axis=2,
+    components: Optional[List[npt.NDArray]] = None,
+    mip_gaps: Optional[List[float]] = None,
+    scheduler: Optional[SolveScheduler] = None,
+    solution_cache: Optional[SolutionCache] = None,
+):
+    """Lay beams over `components`, voxel indices of connected pieces of segments.
+
+    They default to every piece of `segments`, which in turn defaults to every
+    segment of `s_field`. Pieces up to `blob_size_threshold` voxels are solved
+    packed together, and bigger ones are partitioned. Voxels whose layout is not proven optimal are flagged
+    in `unproven`, and the MIP gap of every time limited solve goes to `mip_gaps`.
+    Without a `scheduler`, every solve is limited to `DEFAULT_TIME_LIMIT` seconds.
+    Layouts of blobs solved before come from `solution_cache`.
+    """
+    if components is None:
+        if segments is None:
+            segments = index_armor_segments(s_field)
+        components = segment_components(s_field, segments)
+
+    def flag_unproven(voxels):
+        if unproven is not None:
+            unproven[voxels] = True
+
+    counter = 1
+    result = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+
+    # A lone voxel can only be a 1m block, so it needs no solve
+    single_voxels = np.array(
+        [voxels[0] for voxels in components if len(voxels) == 1], dtype=np.int64
+    )
+    result.values[single_voxels] = counter + np.arange(len(single_voxels))
+    counter += len(single_voxels)
+
+    blobs = []
+    cuts = []
+
+    coords = s_field.coords
+    for voxels in pack_components(
+        s_field,
+        [voxels for voxels in components if len(voxels) > 1],
+        blob_size_threshold,
+    ):
+        points = coords[voxels]
+        if len(points) <= blob_size_threshold:
+            blobs.append(points)
             continue
 
-        for i, decided in enumerate(solution.x):
-            if not decided:
-                continue
+        component_blobs, component_cuts = partition_blob(
+            points, blob_size_threshold, grain_axis
+        )
+        blobs.extend(component_blobs)
+        cuts.extend(component_cuts)
+        flag_unproven(voxels)
+
+    solve_options = dict(
+        coeffs=coeffs,
+        field_shape=s_field.shape,
+        bias_type=bias_type,
+    )
+    def place(blob: npt.NDArray, solution: BlobSolution) -> bool:
+        nonlocal counter
+        optimal, chosen, mip_gap, _ = solution
+        if not optimal:
+            flag_unproven(result.index_of(blob))
+        if chosen is None:
+            return False
+
+        if not optimal and mip_gaps is not None:
+            mip_gaps.append(mip_gap)
+        counter = place_beams(result, blob, chosen, counter)
+        return True
+
+    solve_with_resplits(
+        blobs,
+        cuts,
+        grain_axis,
+        lambda blobs: solve_blobs(
+            blobs, executor, scheduler, solution_cache, **solve_options
+        ),
+        place,
+    )
 
-            coord_indx = i // 10
-            configuration = i % 10
-
-            x, y, z = blob[coord_indx]
-
-            if configuration == 0:
-                result[x, y, z] = counter
-            elif configuration == 1:
-                result[x : x + 2, y, z] = counter
-            elif configuration == 2:
-                result[x : x + 3, y, z] = counter
-            elif configuration == 3:
-                result[x : x + 4, y, z] = counter
-            elif configuration == 4:
-                result[x, y : y + 2, z] = counter
-            elif configuration == 5:
-                result[x, y : y + 3, z] = counter
-            elif configuration == 6:
-                result[x, y : y + 4, z] = counter
-            elif configuration == 7:
-                result[x, y, z : z + 2] = counter
-            elif configuration == 8:
-                result[x, y, z : z + 3] = counter
-            elif configuration == 9:
-                result[x, y, z : z + 4] = counter
-
-            counter += 1
+    stitch_cuts(
+        result,
+        cuts,
+        counter,
+        blob_size_threshold,
+        grain_axis,
+        executor,
+        scheduler=scheduler,
+        solution_cache=solution_cache,
+        **solve_options,
+    )
 
     return result
 
 
-def get_4m_beams_positions(field):
-    result = []
-    for xx, yy, zz in value_indices(field, ignore_value=0).values():
-        if len(xx) == 4:
-            for x, y, z in zip(xx, yy, zz):
-                result.append((x, y, z))
+def settle_components(
+    result: VoxelField,
+    components: List[npt.NDArray],
+    unproven: npt.NDArray,
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    """Decide which beams of a `beamify_procedure` pass over `components` are final.
 
-    if result:
-        return np.vstack(result).T
-    return np.array([[], [], []])
+    A component with a proven optimal layout has an optimal layout in every part,
+    so all of its beams are final. Otherwise only its 4m beams are, and the rest
+    of it is solved again, unless it has no 4m beams either: its voxels would then
+    be the same next pass, and so would its layout.
 
+    Returns voxels whose beams are final and voxels to solve again.
+    """
+    voxels = np.concatenate(components)
+    sizes = np.array([len(component) for component in components])
+    component_of = np.repeat(np.arange(len(components)), sizes)
 
-def beamify(
-    s_field: npt.NDArray, grain_directions="zxy", bias_type: BIAS_TYPES = "random", debeamify=False,
-) -> npt.NDArray:
-    coeffs = np.array(
-        [
-            4,  # Single blocks are universally bad
-            -2 * 1.1,
-            -3 * 1.15,
-            -4 * 1.2,
-            -2 * 1.1,
-            -3 * 1.15,
-            -4 * 1.2,
-            -2 * 1.1,
-            -3 * 1.15,
-            -4 * 1.2,
-        ]
+    labels = result.values[voxels]
+    in_4m_beam = (np.bincount(labels) == 4)[labels]
+
+    has_4m_beams = np.bincount(component_of[in_4m_beam], minlength=len(components)) > 0
+    is_unproven = (
+        np.bincount(component_of[unproven[voxels]], minlength=len(components)) > 0
     )
+    final = ~(is_unproven & has_4m_beams)
 
-    if divisor := 2 ** grain_directions.index("x"):
-        coeffs[1:4] /= divisor
-    if divisor := 2 ** grain_directions.index("y"):
-        coeffs[4:7] /= divisor
-    if divisor := 2 ** grain_directions.index("z"):
-        coeffs[7:10] /= divisor
+    settled = final[component_of] | in_4m_beam
+    return voxels[settled], voxels[~settled]
 
-    s_field = s_field.copy()
 
-    sub_results = []
-
-    current_zone_size = np.count_nonzero(s_field)
-    signal = Event()
-    while True:
-        result = beamify_procedure(
-            s_field,
-            tuple(coeffs),
-            blob_size_threshold=current_zone_size,  # type: ignore
-            failed_solutions_signal=signal,
-            bias_type=bias_type,
-            debeamify=debeamify
-        )
-        bx, by, bz = get_4m_beams_positions(result)
+def layout_beams(
+    result: VoxelField,
+) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+    """First voxel coordinates, axis and length of every beam laid out in `result`.
 
-        sub_results.append(result)
+    The axis of 1m blocks is meaningless.
+    """
+    order = np.argsort(result.values, kind="stable")
+    order = order[result.values[order] != 0]
+    starts = np.flatnonzero(np.diff(result.values[order], prepend=0))
+    lengths = np.diff(starts, append=len(order))
 
-        if signal.is_set():
-            current_zone_size //= 2
-            signal.clear()
+    # Voxels are in C order, so every beam starts at its first voxel
+    coords = result.coords
+    origins = coords[order[starts]]
+    axes = np.argmax(coords[order[starts + lengths - 1]] != origins, axis=1)
+    return origins, axes, lengths
 
-        # Successful run
-        if len(bx):
-            s_field[bx, by, bz] = 0
-        else:
-            break
 
-    # Time to gather them together
-    final_result = np.zeros_like(s_field)
-    counter = 1
-    for sub_result in sub_results[:-1]:
-        for xx, yy, zz in value_indices(sub_result, ignore_value=0).values():
-            if len(xx) == 4:
-                final_result[xx, yy, zz] = counter
-                counter += 1
-
-    for xx, yy, zz in value_indices(sub_results[-1], ignore_value=0).values():
-        final_result[xx, yy, zz] = counter
-        counter += 1
+def layout_objective(
+    s_field: VoxelField,
+    result: VoxelField,
+    coeffs: Tuple[float, float, float, float, float, float, float, float, float, float],
+    bias_type: BIAS_TYPES = "random",
+) -> float:
+    """Value of the MILP objective for the beams laid out in `result`"""
+    origins, axes, lengths = layout_beams(result)
+    configurations = np.where(lengths > 1, 3 * axes + lengths - 1, 0)
+
+    beam_coefficients = blob_coefficients(origins, coeffs, s_field.shape, bias_type)
+    return float(
+        beam_coefficients.reshape(-1, 10)[np.arange(len(origins)), configurations].sum()
+    )
+
+
+def unit_layout(s_field: VoxelField) -> VoxelField:
+    """Layout with every armor voxel as a 1m block of its own"""
+    occupied = s_field.values != 0
+    return s_field.with_values(
+        np.where(occupied, np.cumsum(occupied, dtype=np.int64), 0)
+    )
+
+
+def beamify(
+    s_field: VoxelField,
+    grain_directions="zxy",
+    bias_type: BIAS_TYPES = "random",
+    debeamify=False,
+    workers=1,
+    lanes=False,
+    mip_gaps: Optional[List[float]] = None,
+    time_budget: Optional[float] = None,
+    use_solution_cache=False,
+    segments: Optional[SegmentIndex] = None,
+) -> VoxelField:
+    # Debeamifying has only one answer, so there's nothing to solve
+    if debeamify:
+        return unit_layout(s_field)
+
+    coeffs = grain_coefficients(grain_directions)
+    grain_axis = "xyz".index(grain_directions[0])
+
+    s_field = s_field.copy()
+
+    # Settle runs along the primary grain axis up front, leaving the MILP the rest.
+    # This is faster, but beams across lanes can no longer compete with them
+    lane_result = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+    if lanes:
+        lane_result = solve_lanes(s_field, tuple(coeffs), grain_axis, bias_type)
+        s_field.values[lane_result.values != 0] = 0
+
+    # A segment index of the whole field stays valid for any part of it
+    segments = index_armor_segments(s_field, segments)
+    components = segment_components(s_field, segments)
+
+    # Finished beams go straight into the final layout, so no pass is kept around
+    final_result = lane_result
+    counter = int(lane_result.values.max(initial=0))
+    # With a time budget, blob sizes and time limits adapt to predicted solve times
+    scheduler = None
+    if time_budget is not None:
+        scheduler = SolveScheduler(time_budget, workers)
+    solution_cache = open_solution_cache() if use_solution_cache else None
+    coords = s_field.coords
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        while components:
+            blob_size_threshold = len(s_field)
+            if scheduler is not None:
+                blob_size_threshold = scheduler.blob_size_threshold(
+                    np.array(
+                        [blob_model_statistics(coords[voxels]) for voxels in components]
+                    )
+                )
+
+            unproven = np.zeros(len(s_field), dtype=bool)
+            result = beamify_procedure(
+                s_field,
+                tuple(coeffs),
+                blob_size_threshold=blob_size_threshold,
+                unproven=unproven,
+                bias_type=bias_type,
+                executor=executor,
+                grain_axis=grain_axis,
+                components=components,
+                mip_gaps=mip_gaps,
+                scheduler=scheduler,
+                solution_cache=solution_cache,
+            )
+
+            settled, unsettled = settle_components(result, components, unproven)
+            final_result.values[settled] = counter + result.values[settled]
+            counter += int(result.values.max(initial=0))
+            del result
+
+            remaining = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+            remaining.values[unsettled] = s_field.values[unsettled]
+            segments = index_armor_segments(remaining, segments)
+            components = segment_components(s_field, segments)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if scheduler is not None:
+            scheduler.history.save()
+        if solution_cache is not None:
+            solution_cache.close()
 
     return final_result
@@ -1,14 +1,24 @@
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from copy import deepcopy as copy
+from hashlib import sha256
+from mmap import ACCESS_READ, mmap
+from os import cpu_count, walk
 from pathlib import Path
-from typing import ClassVar, Dict, ForwardRef, List
+from typing import ClassVar, Dict, ForwardRef, List, NamedTuple, Optional
 
 import json
+import pickle
+import re
 
 from attr import attrib, attrs
 
 import numpy as np
 import numpy.typing as npt
 
+from .cache import files_fingerprint, user_cache_dir, write_atomically
+from .timing import Timings, timed
+
 
 GuidMapValue = (
     int
@@ -18,7 +28,7 @@ GuidMapValue = (
     | Dict[str, ForwardRef("GuidMapValue")]
 )
 GuidMapDef = Dict[str, GuidMapValue]
-GuidMap = Dict[str, GuidMapDef]
+GuidMap = Mapping[str, GuidMapDef]
 
 
 @attrs(auto_attribs=True)
@@ -150,11 +160,63 @@ class PhantomBlock:
         return getattr(self.parent, name)
 
 
+@attrs(auto_attribs=True)
+class BlockTable:
+    """Cells occupied by blocks on a craft, stored column-wise.
+
+    A block gets one row per cell it occupies, and `parent` holds the row of
+    the cell the block itself sits in.
+    """
+
+    guid_entries: List[GuidMapDef] = attrib(repr=False)
+
+    coords: npt.NDArray
+    guid_index: npt.NDArray
+    color: npt.NDArray
+    rot: npt.NDArray
+    parent: npt.NDArray
+
+    @property
+    def guids(self) -> List[str]:
+        return [entry["ComponentId"]["Guid"] for entry in self.guid_entries]  # type: ignore
+
+    def __len__(self):
+        return len(self.coords)
+
+    def __iter__(self):
+        """Block/PhantomBlock view of the table, for code that works block by block"""
+        parent_blocks = {}
+
+        def parent_block(row):
+            if row not in parent_blocks:
+                parent_blocks[row] = Block(
+                    guid_entry=self.guid_entries[self.guid_index[row]],
+                    coord=self.coords[row],
+                    color=int(self.color[row]),
+                    rot=int(self.rot[row]),
+                )
+            return parent_blocks[row]
+
+        for row, parent in enumerate(self.parent):
+            if parent == row:
+                yield parent_block(row)
+            else:
+                yield PhantomBlock(coord=self.coords[row], parent=parent_block(parent))
+
+
 def quaternion_by_vector(q: npt.NDArray, v: npt.NDArray):
+    """Rotate vector `v`, or every row of an (N, 3) array of vectors, by `q`"""
     u = q[:3]
     s = q[3]
 
-    return 2 * (u @ v) * u + (s**2 - u @ u) * v + 2 * s * np.cross(u, v)
+    return 2 * (v @ u)[..., None] * u + (s**2 - u @ u) * v + 2 * s * np.cross(u, v)
+
+
+def parse_vectors(vector_strings: List[str]) -> npt.NDArray:
+    """Parse a list of "x,y,z" strings into an (N, 3) float array in one go"""
+    if not vector_strings:
+        return np.zeros((0, 3))
+    return np.array(",".join(vector_strings).split(","), dtype=float).reshape(-1, 3)
 
 
 def quaternion_by_quaternion(q1, q2):
@@ -171,206 +233,471 @@ def quaternion_by_quaternion(q1, q2):
     )
 
 
-def get_guid_map(streaming_data_path: Path):
-    base_items = []
-    for path in streaming_data_path.glob("**/*.item"):
-        with open(path) as in_:
-            base_items.append(json.load(in_))
-
-    item_dups = []
-    for path in streaming_data_path.glob("**/*.itemduplicateandmodify"):
-        with open(path) as in_:
-            item_dups.append(json.load(in_))
-
-    guid_map = {base["ComponentId"]["Guid"]: base for base in base_items}
-
-    # Inject default data
-    default_directions = {
-        "Up": False,
-        "Down": False,
-        "Forwards": False,
-        "Back": False,
-        "Right": False,
-        "Left": False,
-    }
-    default_reference_to_component = {
-        "Reference": {"Name": "", "Guid": "00000000-0000-0000-0000-000000000000"}
-    }
-    default_data = {
-        "Health": 100,
-        "Weight": 0.01,
-        "ArmourClass": 4,
-        "eRadarCrossSection": 30,
-        "AttachDirections": copy(default_directions),
-        "SupportDirections": copy(default_directions),
-        "ActiveBlockLink": copy(default_reference_to_component),
-        "MirrorLaterialFlipReplacementReference": copy(default_reference_to_component),
-        "MirrorVerticalFlipReplacementReference": copy(default_reference_to_component),
-        "MeshReference": copy(default_reference_to_component),
-        "MaterialReference": copy(default_reference_to_component),
-        "Cost": {
-            "Material": 0,
-        },
-        "ExtraSettings": {
-            "WaterTight": True,
-            "BlockPathfinding": True,
-            "ViewMeshWhenPlacing": True,
-            "LocalRotationToForward": False,
-            "PlaceableOnFortress": True,
-            "PlaceableOnStructure": True,
-            "PlaceableOnVehicle": True,
-            "PlaceableInPrefab": True,
-            "PlaceableOnSubConstructable": 2,
-            "AutomaticallyGenerateCollider": True,
-            "StructuralComponent": False,
-            "EmpSusceptibility": 0,
-            "EmpResistivity": 1,
-            "EmpDamageFactor": 1,
-            "FractionHeatDamagePerMeterPenetration": 0.05,
-            "ExplosionOnDeath": 0,
-            "Flammability": 0.5,
-            "FireResistance": 10,
-            "CreateListOfTheseBlocks": True,
-            "UseCustomName": False,
-            "UseALowLodRender": True,
-            "AllowsExhaust": False,
-            "AllowsVisibleBandTransmission": False,
-            "AllowsIrBandTransmission": False,
-            "AllowsRadarBandTransmission": False,
-            "AllowsSonarBandTransmission": False,
-            "RenderInImportantView": False,
-        },
-        "DragSettings": {
-            "DragClearancePositions": [],
-            "DragStopper": True,
-            "DragFactorNeg": "1,1,1",
-            "DragFactorPos": "1,1,1",
-            "Geometry": 0,
-        },
-        "Code": {
-            "GroupConnectionInfo": {
-                "SpreadToTypePermissions": "0" * 32,
-                "ExtraRightUpForwardElementJumps": "0,0,0",
-                "ExtraLeftDownBackElementJumps": "0,0,0",
-                "ReceiveDirections": copy(default_directions),
-                "SendDirections": copy(default_directions),
-                "BlockGroupReference": copy(default_reference_to_component),
-            }
-        },
-        "SizeInfo": {
-            "SizePos": {"x": 0, "y": 0, "z": 0},
-            "SizeNeg": {"x": 0, "y": 0, "z": 0},
-            "VolumeFactor": 1.0,
-            "VolumeBuoyancyExtraFactor": 1.0,
-            "ArrayPositionsUsed": 1,
-            "LocalCenter": "0,0,0",
-        },
-        "SubObjects": {"SubObjects": []},
-        "Sounds": {"Sounds": []},
-    }
-
-    for item in guid_map.values():
-        sub_dicts = [(default_data, item)]
-
-        while sub_dicts:
-            default, target = sub_dicts.pop()
-
-            for key, default_value in default.items():
-                if type(default_value) is dict:
-                    if key not in target or target[key] is None:
-                        target[key] = copy(default_value)
-                    else:
-                        sub_dicts.append((default_value, target[key]))
-                    continue
-                if key not in target or target[key] is None:
-                    target[key] = default_value
-
-    default_dup = {
-        "CostWeightHealthScaling": 1,
-        "CostScaling": 1,
-        "HealthScaling": 1,
-        "ArmourScaling": 1,
-        "WeightScaling": 1,
-        "VolumeScaling": 1,
-        "DisplayOnInventory": True,
-        "InventoryTabOrVariantId": copy(default_reference_to_component),
-        "MeshReference": copy(default_reference_to_component),
-        "MaterialReference": copy(default_reference_to_component),
-        "IdToDuplicate": copy(default_reference_to_component),
-        "MirrorLaterialFlipReplacementReference": copy(default_reference_to_component),
-        "MirrorVerticalFlipReplacementReference": copy(default_reference_to_component),
-    }
-
-    for dup_def in item_dups:
-        sub_dicts = [(default_dup, dup_def)]
-
-        while sub_dicts:
-            default, target = sub_dicts.pop()
-
-            for key, default_value in default.items():
-                if type(default_value) is dict:
-                    if key not in target or target[key] is None:
-                        target[key] = copy(default_value)
-                    else:
-                        sub_dicts.append((default_value, target[key]))
-                    continue
+DEFAULT_DIRECTIONS = {
+    "Up": False,
+    "Down": False,
+    "Forwards": False,
+    "Back": False,
+    "Right": False,
+    "Left": False,
+}
+DEFAULT_REFERENCE_TO_COMPONENT = {
+    "Reference": {"Name": "", "Guid": "00000000-0000-0000-0000-000000000000"}
+}
+DEFAULT_ITEM_DATA = {
+    "Health": 100,
+    "Weight": 0.01,
+    "ArmourClass": 4,
+    "eRadarCrossSection": 30,
+    "AttachDirections": copy(DEFAULT_DIRECTIONS),
+    "SupportDirections": copy(DEFAULT_DIRECTIONS),
+    "ActiveBlockLink": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MirrorLaterialFlipReplacementReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MirrorVerticalFlipReplacementReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MeshReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MaterialReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "Cost": {
+        "Material": 0,
+    },
+    "ExtraSettings": {
+        "WaterTight": True,
+        "BlockPathfinding": True,
+        "ViewMeshWhenPlacing": True,
+        "LocalRotationToForward": False,
+        "PlaceableOnFortress": True,
+        "PlaceableOnStructure": True,
+        "PlaceableOnVehicle": True,
+        "PlaceableInPrefab": True,
+        "PlaceableOnSubConstructable": 2,
+        "AutomaticallyGenerateCollider": True,
+        "StructuralComponent": False,
+        "EmpSusceptibility": 0,
+        "EmpResistivity": 1,
+        "EmpDamageFactor": 1,
+        "FractionHeatDamagePerMeterPenetration": 0.05,
+        "ExplosionOnDeath": 0,
+        "Flammability": 0.5,
+        "FireResistance": 10,
+        "CreateListOfTheseBlocks": True,
+        "UseCustomName": False,
+        "UseALowLodRender": True,
+        "AllowsExhaust": False,
+        "AllowsVisibleBandTransmission": False,
+        "AllowsIrBandTransmission": False,
+        "AllowsRadarBandTransmission": False,
+        "AllowsSonarBandTransmission": False,
+        "RenderInImportantView": False,
+    },
+    "DragSettings": {
+        "DragClearancePositions": [],
+        "DragStopper": True,
+        "DragFactorNeg": "1,1,1",
+        "DragFactorPos": "1,1,1",
+        "Geometry": 0,
+    },
+    "Code": {
+        "GroupConnectionInfo": {
+            "SpreadToTypePermissions": "0" * 32,
+            "ExtraRightUpForwardElementJumps": "0,0,0",
+            "ExtraLeftDownBackElementJumps": "0,0,0",
+            "ReceiveDirections": copy(DEFAULT_DIRECTIONS),
+            "SendDirections": copy(DEFAULT_DIRECTIONS),
+            "BlockGroupReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+        }
+    },
+    "SizeInfo": {
+        "SizePos": {"x": 0, "y": 0, "z": 0},
+        "SizeNeg": {"x": 0, "y": 0, "z": 0},
+        "VolumeFactor": 1.0,
+        "VolumeBuoyancyExtraFactor": 1.0,
+        "ArrayPositionsUsed": 1,
+        "LocalCenter": "0,0,0",
+    },
+    "SubObjects": {"SubObjects": []},
+    "Sounds": {"Sounds": []},
+}
+
+DEFAULT_DUP_DATA = {
+    "CostWeightHealthScaling": 1,
+    "CostScaling": 1,
+    "HealthScaling": 1,
+    "ArmourScaling": 1,
+    "WeightScaling": 1,
+    "VolumeScaling": 1,
+    "DisplayOnInventory": True,
+    "InventoryTabOrVariantId": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MeshReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MaterialReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "IdToDuplicate": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MirrorLaterialFlipReplacementReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+    "MirrorVerticalFlipReplacementReference": copy(DEFAULT_REFERENCE_TO_COMPONENT),
+}
+
+
+def inject_defaults(default_data: GuidMapDef, item: GuidMapDef):
+    sub_dicts = [(default_data, item)]
+
+    while sub_dicts:
+        default, target = sub_dicts.pop()
+
+        for key, default_value in default.items():
+            if type(default_value) is dict:
                 if key not in target or target[key] is None:
-                    target[key] = default_value
-
-    for dup in item_dups:
-        guid_target = dup["IdToDuplicate"]["Reference"]["Guid"]
-        source_item = copy(guid_map[guid_target])
-
-        source_item["ComponentId"] = dup.get("ComponentId")
-        source_item["Description"] = dup.get("Description")
-        source_item["ArmourClass"] *= dup["ArmourScaling"]
-        source_item["Health"] *= dup["CostWeightHealthScaling"] * dup["HealthScaling"]
-        source_item["Weight"] *= dup["CostWeightHealthScaling"] * dup["WeightScaling"]
-        source_item["Cost"]["Material"] *= (
-            dup["CostWeightHealthScaling"] * dup["CostScaling"]
-        )
-        source_item["SizeInfo"] = (
-            dup["SizeInfo"] if dup["change_SizeInfo"] else source_item["SizeInfo"]
-        )
-        source_item["DragSettings"] = (
-            dup["DragSettings"]
-            if dup["change_DragSettings"]
-            else source_item["DragSettings"]
-        )
+                    target[key] = copy(default_value)
+                else:
+                    sub_dicts.append((default_value, target[key]))
+                continue
+            if key not in target or target[key] is None:
+                target[key] = default_value
+
+
+def resolve_duplicate(source_item: GuidMapDef, dup: GuidMapDef) -> GuidMapDef:
+    source_item = copy(source_item)
+
+    source_item["ComponentId"] = dup.get("ComponentId")
+    source_item["Description"] = dup.get("Description")
+    source_item["ArmourClass"] *= dup["ArmourScaling"]
+    source_item["Health"] *= dup["CostWeightHealthScaling"] * dup["HealthScaling"]
+    source_item["Weight"] *= dup["CostWeightHealthScaling"] * dup["WeightScaling"]
+    source_item["Cost"]["Material"] *= (
+        dup["CostWeightHealthScaling"] * dup["CostScaling"]
+    )
+    source_item["SizeInfo"] = (
+        dup["SizeInfo"] if dup["change_SizeInfo"] else source_item["SizeInfo"]
+    )
+    source_item["DragSettings"] = (
+        dup["DragSettings"]
+        if dup["change_DragSettings"]
+        else source_item["DragSettings"]
+    )
 
-        if dup.get("ClassNameOverride"):
-            source_item["Code"]["ClassName"] = dup["ClassNameOverride"]
+    if dup.get("ClassNameOverride"):
+        source_item["Code"]["ClassName"] = dup["ClassNameOverride"]
 
-        source_item["MeshReference"] = (
-            dup["MeshReference"]
-            if dup["MeshReference"]["IsValidReference"]
-            else source_item["MeshReference"]
-        )
-        source_item["MaterialReference"] = (
-            dup["MaterialReference"]
-            if dup["MaterialReference"]["IsValidReference"]
-            else source_item["MaterialReference"]
-        )
-        source_item["MirrorLaterialFlipReplacementReference"] = (
-            dup["MirrorLaterialFlipReplacementReference"]
-            if dup["MirrorLaterialFlipReplacementReference"]["IsValidReference"]
-            else source_item["MirrorLaterialFlipReplacementReference"]
-        )
-        source_item["MirrorVerticalFlipReplacementReference"] = (
-            dup["MirrorVerticalFlipReplacementReference"]
-            if dup["MirrorVerticalFlipReplacementReference"]["IsValidReference"]
-            else source_item["MirrorVerticalFlipReplacementReference"]
-        )
-        source_item["InventoryNameOverride"] = dup.get("InventoryNameOverride")
-        source_item["InventoryCategoryNameOverride"] = dup.get(
-            "InventoryCategoryNameOverride"
-        )
-        source_item["DisplayName"] = dup.get("DisplayName")
-        source_item["ExtraSettings"]["LocalRotationToForward"] = False
+    source_item["MeshReference"] = (
+        dup["MeshReference"]
+        if dup["MeshReference"]["IsValidReference"]
+        else source_item["MeshReference"]
+    )
+    source_item["MaterialReference"] = (
+        dup["MaterialReference"]
+        if dup["MaterialReference"]["IsValidReference"]
+        else source_item["MaterialReference"]
+    )
+    source_item["MirrorLaterialFlipReplacementReference"] = (
+        dup["MirrorLaterialFlipReplacementReference"]
+        if dup["MirrorLaterialFlipReplacementReference"]["IsValidReference"]
+        else source_item["MirrorLaterialFlipReplacementReference"]
+    )
+    source_item["MirrorVerticalFlipReplacementReference"] = (
+        dup["MirrorVerticalFlipReplacementReference"]
+        if dup["MirrorVerticalFlipReplacementReference"]["IsValidReference"]
+        else source_item["MirrorVerticalFlipReplacementReference"]
+    )
+    source_item["InventoryNameOverride"] = dup.get("InventoryNameOverride")
+    source_item["InventoryCategoryNameOverride"] = dup.get(
+        "InventoryCategoryNameOverride"
+    )
+    source_item["DisplayName"] = dup.get("DisplayName")
+    source_item["ExtraSettings"]["LocalRotationToForward"] = False
+
+    return source_item
+
+
+class GuidIndexEntry(NamedTuple):
+    """Location of the JSON definition of an item"""
+
+    path: str
+    offset: int
+    length: int
+
+
+GuidIndex = Dict[str, GuidIndexEntry]
+
+
+class LazyGuidMap(Mapping):
+    """Guid map that only parses and resolves items when they are looked up"""
+
+    def __init__(
+        self,
+        item_index: GuidIndex,
+        dup_index: GuidIndex,
+        timings: Optional[Timings] = None,
+    ):
+        self.item_index = item_index
+        self.dup_index = dup_index
+        self.timings = timings
+
+        self.base_items: GuidMap = {}
+        self.resolved_items: GuidMap = {}
 
-        guid_map[source_item["ComponentId"]["Guid"]] = source_item
+    def __getitem__(self, guid: str) -> GuidMapDef:
+        if guid not in self.resolved_items:
+            if guid in self.dup_index:
+                self.resolved_items[guid] = self.resolve_dup(guid)
+            else:
+                self.resolved_items[guid] = self.base_item(guid)
 
-    return guid_map
+        return self.resolved_items[guid]
+
+    def __iter__(self):
+        return iter({**self.item_index, **self.dup_index})
+
+    def __len__(self):
+        return len(self.item_index.keys() | self.dup_index.keys())
+
+    def __contains__(self, guid):
+        return guid in self.item_index or guid in self.dup_index
+
+    def base_item(self, guid: str) -> GuidMapDef:
+        if guid not in self.base_items:
+            item = read_indexed_item(self.item_index[guid])
+            with timed(self.timings, "default-fill"):
+                inject_defaults(DEFAULT_ITEM_DATA, item)
+            self.base_items[guid] = item
+
+        return self.base_items[guid]
+
+    def resolve_dup(self, guid: str) -> GuidMapDef:
+        dup = read_indexed_item(self.dup_index[guid])
+        with timed(self.timings, "default-fill"):
+            inject_defaults(DEFAULT_DUP_DATA, dup)
+
+        guid_target = dup["IdToDuplicate"]["Reference"]["Guid"]  # type: ignore
+        # A duplicate can shadow the very item it duplicates
+        if guid_target == guid:
+            source_item = self.base_item(guid_target)
+        else:
+            source_item = self[guid_target]
+
+        with timed(self.timings, "duplicate resolution"):
+            return resolve_duplicate(source_item, dup)
+
+
+def read_indexed_item(entry: GuidIndexEntry) -> GuidMapDef:
+    with open(entry.path, "rb") as in_:
+        in_.seek(entry.offset)
+        return json.loads(in_.read(entry.length))
+
+
+GUID_MAP_CACHE_VERSION = 2
+
+
+def get_guid_map(
+    streaming_data_path: Path,
+    use_cache=True,
+    rebuild_cache=False,
+    scan_workers=8,
+    timings: Optional[Timings] = None,
+):
+    timings = {} if timings is None else timings
+
+    with timed(timings, "walk"):
+        item_paths, dup_paths = scan_item_files(streaming_data_path)
+
+    if use_cache:
+        try:
+            cache_dir = user_cache_dir()
+        except OSError:
+            # Without a usable cache directory, run as if caching were off
+            use_cache = False
+
+    if not use_cache:
+        raw_defs = read_item_files(item_paths, dup_paths, scan_workers, timings)
+        return uncached_guid_map(raw_defs, timings)
+
+    # One cache file per FtD install
+    install_key = sha256(str(streaming_data_path.resolve()).encode()).hexdigest()
+    cache_path = cache_dir / f"guid_map-{install_key[:16]}.pickle"
+    with timed(timings, "fingerprint"):
+        header = {
+            "version": GUID_MAP_CACHE_VERSION,
+            "fingerprint": files_fingerprint(item_paths + dup_paths),
+        }
+
+    if not rebuild_cache:
+        try:
+            with timed(timings, "cache load"):
+                indices = load_guid_index(cache_path, header)
+            return LazyGuidMap(*indices, timings=timings)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            pass
+
+    raw_defs = read_item_files(item_paths, dup_paths, scan_workers, timings)
+
+    with timed(timings, "cache write"):
+        # The cache packs raw item JSON back to back, with a guid -> offset index
+        payload = []
+        offsets = []
+        position = 0
+        for raw_def in raw_defs:
+            offsets.append({})
+            for guid, (_, raw) in raw_def.items():
+                offsets[-1][guid] = (position, len(raw))
+                payload.append(raw)
+                position += len(raw)
+
+        try:
+            write_atomically(cache_path, header, offsets, payload=b"".join(payload))
+        except OSError:
+            return uncached_guid_map(raw_defs, timings)
+
+    return LazyGuidMap(*load_guid_index(cache_path, header), timings=timings)
+
+
+def uncached_guid_map(raw_defs, timings: Optional[Timings] = None):
+    """Guid map reading entries straight from the item files"""
+    return LazyGuidMap(
+        *(
+            {
+                guid: GuidIndexEntry(str(path), 0, len(raw))
+                for guid, (path, raw) in raw_def.items()
+            }
+            for raw_def in raw_defs
+        ),
+        timings=timings,
+    )
+
+
+def load_guid_index(cache_path: Path, header):
+    with cache_path.open("rb") as in_:
+        if pickle.load(in_) != header:
+            raise ValueError("Stale guid map cache")
+        offsets = pickle.load(in_)
+        data_start = in_.tell()
+
+    return tuple(
+        {
+            guid: GuidIndexEntry(str(cache_path), data_start + offset, length)
+            for guid, (offset, length) in index.items()
+        }
+        for index in offsets
+    )
+
+
+def scan_item_files(streaming_data_path: Path):
+    """Paths of all base item and duplicate definitions, found in a single walk"""
+    item_paths, dup_paths = [], []
+    for root, _, file_names in walk(streaming_data_path):
+        for file_name in file_names:
+            if file_name.endswith(".item"):
+                item_paths.append(Path(root, file_name))
+            elif file_name.endswith(".itemduplicateandmodify"):
+                dup_paths.append(Path(root, file_name))
+
+    return sorted(item_paths), sorted(dup_paths)
+
+
+def item_guid(raw: bytes) -> str:
+    return json.loads(raw)["ComponentId"]["Guid"]
+
+
+def read_item_files(
+    item_paths: List[Path],
+    dup_paths: List[Path],
+    scan_workers=8,
+    timings: Optional[Timings] = None,
+):
+    """Raw JSON of every base item and duplicate definition, keyed by guid"""
+    paths = item_paths + dup_paths
+
+    # Reading is I/O bound and releases the GIL, so threads are enough
+    with timed(timings, "read"):
+        if scan_workers > 1:
+            with ThreadPoolExecutor(scan_workers) as executor:
+                raws = [*executor.map(Path.read_bytes, paths)]
+        else:
+            raws = [*map(Path.read_bytes, paths)]
+
+    # Parsing is CPU bound, so it needs processes to go parallel
+    parse_workers = min(scan_workers, cpu_count() or 1)
+    with timed(timings, "parse"):
+        if parse_workers > 1:
+            with ProcessPoolExecutor(parse_workers) as executor:
+                guids = [*executor.map(item_guid, raws, chunksize=64)]
+        else:
+            guids = [*map(item_guid, raws)]
+
+    defs = [*zip(guids, zip(paths, raws))]
+    return dict(defs[: len(item_paths)]), dict(defs[len(item_paths) :])
+
+
+# Per-block columns of every construct, read straight into arrays of these types
+BLOCK_COLUMNS = {
+    "BlockIds": np.int64,
+    "BLP": np.float64,
+    "BLR": np.int64,
+    "BCI": np.int32,
+}
+BLOCK_COLUMN_PATTERN = re.compile(rb'"(BlockIds|BLP|BLR|BCI)"\s*:\s*\[')
+
+
+def parse_column(key: str, content: bytes) -> npt.NDArray:
+    """Array of the elements of a block column, from the JSON between its
+    brackets. BLP becomes an (N, 3) array, integer if every position is. Nulls
+    read as 0, masked so they can be written back as they were."""
+    nulls = None
+    if key == "BLP":
+        # "x,y,z" strings are read as one flat run of numbers
+        content = content.replace(b'"', b"")
+    elif b"null" in content:
+        nulls = np.array(
+            [element.strip() == b"null" for element in content.split(b",")]
+        )
+        content = content.replace(b"null", b"0")
+
+    column = np.fromstring(content, dtype=BLOCK_COLUMNS[key], sep=",")
+    if len(column) != (content.count(b",") + 1 if content.strip() else 0):
+        raise ValueError(f"Malformed {key} column")
+
+    if key == "BLP":
+        column = column.reshape(-1, 3)
+        integral = column.astype(np.int64)
+        if np.array_equal(integral, column):
+            return integral
+    if nulls is not None:
+        return np.ma.masked_array(column, mask=nulls)
+    return column
+
+
+def restore_columns(node, columns: List[npt.NDArray]):
+    """Put `columns` back in place of the indices `load_blueprint` left"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in BLOCK_COLUMNS and isinstance(value, int):
+                node[key] = columns[value]
+            else:
+                restore_columns(value, columns)
+    elif isinstance(node, list):
+        for item in node:
+            restore_columns(item, columns)
+
+
+def load_blueprint(bp_path: Path):
+    """Blueprint document with the block columns of every construct as arrays.
+
+    Columns are scanned out of the memory-mapped file and parsed by NumPy, so
+    they never exist as Python objects. Only the rest of the document, with an
+    index in place of every column, goes through `json`.
+    """
+    columns = []
+    rest = []
+    with bp_path.open("rb") as in_, mmap(in_.fileno(), 0, access=ACCESS_READ) as data:
+        end = 0
+        for match in BLOCK_COLUMN_PATTERN.finditer(data):
+            if data[match.start() - 1 : match.start()] == b"\\":
+                # Escaped quote, so this is part of a string
+                continue
+
+            close = data.find(b"]", match.end())
+            rest += [data[end : match.end() - 1], b"%d" % len(columns)]
+            columns.append(parse_column(match[1].decode(), data[match.end() : close]))
+            end = close + 1
+        rest.append(data[end:])
+
+    bp = json.loads(b"".join(rest))
+    restore_columns(bp, columns)
+    return bp
 
 
 def parse_blueprint(
@@ -383,24 +710,11 @@ def parse_blueprint(
         pos_offset=np.array([0, 0, 0]),
         local_rotation=np.array([0, 0, 0, 1]),
     ):
-        yield from (
-            Block(
-                guid_entry=guid_map[item_dict[id_]],
-                coord=(
-                    pos_offset
-                    + quaternion_by_vector(
-                        local_rotation, np.array([*map(float, coord_string.split(","))])
-                    )
-                ),
-                rot=rotation,
-                color=color if color else 0,
-            )
-            for id_, coord_string, rotation, color in zip(
-                construct["BlockIds"],
-                construct["BLP"],
-                construct["BLR"],
-                construct["BCI"],
-            )
+        yield (
+            construct["BlockIds"],
+            pos_offset + quaternion_by_vector(local_rotation, construct["BLP"]),
+            construct["BLR"],
+            construct["BCI"],
         )
 
         # Subconstructs are a pain in the ass because of LocalRotation
@@ -418,43 +732,76 @@ def parse_blueprint(
 
                 yield from parser(sc, sc_pos_offset, sc_local_rotation)
 
-    with bp_path.open("r") as in_:
-        bp = json.load(in_)
+    bp = load_blueprint(bp_path)
 
     item_dict = {int(key): guid for key, guid in bp["ItemDictionary"].items()}
-    block_data = [*parser(bp["Blueprint"])]
+    ids, block_coords, rots, colors = (
+        np.ma.getdata(np.concatenate(column))
+        for column in zip(*parser(bp["Blueprint"]))
+    )
 
-    # Create a block field
-    blocks = []
-    for block in block_data:
-        size_neg_delta = sum(
-            [
-                block.rot_x * block.guid_entry["SizeInfo"]["SizeNeg"]["x"],  # type: ignore
-                block.rot_y * block.guid_entry["SizeInfo"]["SizeNeg"]["y"],  # type: ignore
-                block.rot_z * block.guid_entry["SizeInfo"]["SizeNeg"]["z"],  # type: ignore
-            ]
-        )
-        size_pos_delta = sum(
+    # Resolve every distinct item id once
+    unique_ids, id_index = np.unique(ids, return_inverse=True)
+    guid_indices = {}
+    guid_entries = []
+    unique_guid_index = []
+    for id_ in unique_ids:
+        guid = item_dict[int(id_)]
+        if guid not in guid_indices:
+            guid_indices[guid] = len(guid_entries)
+            guid_entries.append(guid_map[guid])
+        unique_guid_index.append(guid_indices[guid])
+    guid_index = np.array(unique_guid_index, dtype=np.int32)[id_index]
+
+    size_neg, size_pos = (
+        np.array(
             [
-                block.rot_x * block.guid_entry["SizeInfo"]["SizePos"]["x"],  # type: ignore
-                block.rot_y * block.guid_entry["SizeInfo"]["SizePos"]["y"],  # type: ignore
-                block.rot_z * block.guid_entry["SizeInfo"]["SizePos"]["z"],  # type: ignore
-            ]
-        )
+                [entry["SizeInfo"][size_key][axis] for axis in "xyz"]  # type: ignore
+                for entry in guid_entries
+            ],
+            dtype=np.int64,
+        ).reshape(-1, 3)[guid_index]
+        for size_key in ("SizeNeg", "SizePos")
+    )
 
-        bounds = np.vstack((-size_neg_delta, size_pos_delta))
-        bounds_min = np.min(bounds, axis=0)
-        bounds_max = np.max(bounds, axis=0)
-
-        for dz in range(bounds_min[2], bounds_max[2] + 1):
-            for dy in range(bounds_min[1], bounds_max[1] + 1):
-                for dx in range(bounds_min[0], bounds_max[0] + 1):
-                    added_block = block
-                    if dx != 0 or dy != 0 or dz != 0:
-                        added_block = PhantomBlock(
-                            coord=block.coord + (dx, dy, dz), parent=block
-                        )
-                    blocks.append(added_block)
+    # Create a block field
+    rot_x, rot_y, rot_z = Block.ROTS_X[rots], Block.ROTS_Y[rots], Block.ROTS_Z[rots]
+    size_neg_delta = (
+        rot_x * size_neg[:, :1] + rot_y * size_neg[:, 1:2] + rot_z * size_neg[:, 2:]
+    )
+    size_pos_delta = (
+        rot_x * size_pos[:, :1] + rot_y * size_pos[:, 1:2] + rot_z * size_pos[:, 2:]
+    )
+    bounds_min = np.minimum(-size_neg_delta, size_pos_delta)
+    bounds_max = np.maximum(-size_neg_delta, size_pos_delta)
+
+    # Every block expands into its footprint, x fastest, then y, then z
+    extents = bounds_max - bounds_min + 1
+    cell_counts = np.prod(extents, axis=1)
+    first_rows = np.cumsum(cell_counts) - cell_counts
+
+    row_block = np.repeat(np.arange(len(ids)), cell_counts)
+    cell = np.arange(len(row_block)) - first_rows[row_block]
+    x_len, y_len, _ = extents[row_block].T
+    offsets = np.stack(
+        (cell % x_len, cell // x_len % y_len, cell // (x_len * y_len)), axis=1
+    )
+    offsets += bounds_min[row_block]
+
+    # Bounds always contain the origin cell, which is where the block itself is
+    x_len, y_len, _ = extents.T
+    origin_rows = first_rows + (
+        (-bounds_min[:, 2] * y_len - bounds_min[:, 1]) * x_len - bounds_min[:, 0]
+    )
+
+    blocks = BlockTable(
+        guid_entries=guid_entries,
+        coords=np.rint(block_coords[row_block] + offsets).astype(np.int32),
+        guid_index=guid_index[row_block],
+        color=colors[row_block],
+        rot=rots[row_block].astype(np.int32),
+        parent=origin_rows[row_block].astype(np.int32),
+    )
 
     color_map = color_map = np.array(
         [
@@ -0,0 +1,41 @@
+from hashlib import sha256
+from os import environ, replace
+from pathlib import Path
+from sys import platform
+from typing import Iterable
+
+import pickle
+
+
+def user_cache_dir() -> Path:
+    """Per-user cache directory for the script, created on demand"""
+    if platform == "win32":
+        base = Path(environ.get("LOCALAPPDATA") or Path.home() / "AppData/Local")
+    elif platform == "darwin":
+        base = Path.home() / "Library/Caches"
+    else:
+        base = Path(environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+
+    cache_dir = base / "ftd_beamification"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def files_fingerprint(paths: Iterable[Path]) -> str:
+    """Hash of file paths, sizes and mtimes. Changes whenever any file does."""
+    digest = sha256()
+    for path in sorted(paths):
+        stat = path.stat()
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def write_atomically(path: Path, *objects, payload=b""):
+    """Pickle `objects` one after another into `path`, followed by raw `payload`,
+    replacing the file atomically"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as out:
+        for obj in objects:
+            pickle.dump(obj, out, protocol=pickle.HIGHEST_PROTOCOL)
+        out.write(payload)
+    replace(tmp_path, path)
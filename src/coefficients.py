@@ -0,0 +1,65 @@
+from typing import Literal, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+BIAS_TYPES = Literal["random"] | Literal["sided"] | Literal["alternate"]
+
+
+def grain_coefficients(grain_directions="zxy") -> npt.NDArray:
+    """Objective coefficient of each of the 10 configurations for a grain"""
+    coeffs = np.array(
+        [
+            4,  # Single blocks are universally bad
+            -2 * 1.1,
+            -3 * 1.15,
+            -4 * 1.2,
+            -2 * 1.1,
+            -3 * 1.15,
+            -4 * 1.2,
+            -2 * 1.1,
+            -3 * 1.15,
+            -4 * 1.2,
+        ]
+    )
+
+    if divisor := 2 ** grain_directions.index("x"):
+        coeffs[1:4] /= divisor
+    if divisor := 2 ** grain_directions.index("y"):
+        coeffs[4:7] /= divisor
+    if divisor := 2 ** grain_directions.index("z"):
+        coeffs[7:10] /= divisor
+
+    return coeffs
+
+
+def blob_coefficients(
+    blob: npt.NDArray,
+    coeffs: Tuple[float, float, float, float, float, float, float, float, float, float],
+    field_shape: Tuple[int, int, int],
+    bias_type: BIAS_TYPES = "random",
+):
+    x, y, z = blob.T
+
+    if bias_type != "random":
+        x_c = x / field_shape[0]
+        y_c = y / field_shape[1]
+        z_c = z / field_shape[2]
+    else:
+        x_c = y_c = z_c = np.zeros(len(blob))
+
+    if bias_type == "alternate":
+        x_c = np.where((y % 2 == 0) | (z % 2 == 0), 1 - x_c, x_c)
+        y_c = np.where((x % 2 == 0) | (z % 2 == 0), 1 - y_c, y_c)
+        z_c = np.where((x % 2 == 0) | (y % 2 == 0), 1 - z_c, z_c)
+
+    coeffs = np.asarray(coeffs, dtype=float)
+    adjusted_coefficients = np.empty((len(blob), 10))
+    adjusted_coefficients[:, 0] = coeffs[0]
+    # We add a tiny constant bias to
+    #   tie-break out-of-grain selections, making them more consistent
+    adjusted_coefficients[:, 1:4] = coeffs[1:4] + x_c[:, None] / 1000 + 1e-4
+    adjusted_coefficients[:, 4:7] = coeffs[4:7] + y_c[:, None] / 1000 + 2e-4
+    adjusted_coefficients[:, 7:10] = coeffs[7:10] + z_c[:, None] / 1000 + 3e-4
+
+    return adjusted_coefficients.ravel()
@@ -0,0 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+from typing import Dict, Iterable, List, Optional, TextIO, Tuple
+
+import sys
+
+import numpy as np
+import numpy.typing as npt
+
+from .beamification import (
+    layout_beams,
+    layout_objective,
+    pack_components,
+    partition_blob,
+    place_beams,
+    segment_components,
+    solve_blob_variants,
+    solve_blobs_within,
+    solve_with_resplits,
+    stitch_cuts,
+)
+from .coefficients import BIAS_TYPES, grain_coefficients
+from .s_field import SegmentIndex, index_armor_segments
+from .voxel_field import VoxelField
+
+
+GRAINS = ["".join(grain) for grain in permutations("xyz", 3)]
+BIASES: List[BIAS_TYPES] = ["sided", "alternate", "random"]
+
+Variant = Tuple[str, BIAS_TYPES]
+
+
+def explore_beamify(
+    s_field: VoxelField,
+    variants: Optional[List[Variant]] = None,
+    workers=1,
+    segments: Optional[SegmentIndex] = None,
+    blob_size_threshold: Optional[int] = None,
+) -> Dict[Variant, VoxelField]:
+    """Beamify for every grain and bias in `variants`, all of them by default.
+
+    Blobs and their models are the same for every variant, only the objective
+    differs, so every blob's model is built once per group of variants and
+    solved for all of them. Groups are solved in parallel, one per worker.
+    Blobs are packed and partitioned like `beamify_procedure` does, without
+    lanes or re-solve passes, and a blob any variant finds no layout for is
+    solved again in halves by all of them, so that every variant is solved on
+    the very same blobs.
+    """
+    if variants is None:
+        variants = [(grain, bias) for grain in GRAINS for bias in BIASES]
+    objectives = [(grain_coefficients(grain), bias) for grain, bias in variants]
+    if blob_size_threshold is None:
+        blob_size_threshold = len(s_field)
+    # Blobs are shared by every grain, so cuts snap to the default grain's lattice
+    grain_axis = 2
+
+    coords = s_field.coords
+    blobs = []
+    cuts = []
+    for voxels in pack_components(
+        s_field,
+        segment_components(s_field, index_armor_segments(s_field, segments)),
+        blob_size_threshold,
+    ):
+        pack_blobs, pack_cuts = partition_blob(
+            coords[voxels], blob_size_threshold, grain_axis
+        )
+        blobs.extend(pack_blobs)
+        cuts.extend(pack_cuts)
+
+    results = [
+        s_field.with_values(np.zeros(len(s_field), dtype=np.int64)) for _ in variants
+    ]
+    counters = [1] * len(variants)
+    groups = np.array_split(np.arange(len(variants)), min(workers, len(variants)))
+
+    def solve(blobs: List[npt.NDArray]) -> Iterable:
+        group_solutions = [
+            solve_blobs_within(
+                blobs,
+                None,
+                executor,
+                solver=solve_blob_variants,
+                variants=[objectives[variant] for variant in group],
+                field_shape=s_field.shape,
+            )
+            for group in groups
+        ]
+        return zip(*group_solutions)
+
+    def place(blob: npt.NDArray, blob_solutions) -> bool:
+        chosen_layouts = [
+            (variant, chosen)
+            for group, group_solution in zip(groups, blob_solutions)
+            for variant, (_, chosen, _, _) in zip(group, group_solution)
+        ]
+        if any(chosen is None for _, chosen in chosen_layouts):
+            return False
+
+        for variant, chosen in chosen_layouts:
+            counters[variant] = place_beams(
+                results[variant], blob, chosen, counters[variant]
+            )
+        return True
+
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        solve_with_resplits(blobs, cuts, grain_axis, solve, place)
+
+        for variant, (coeffs, bias_type) in enumerate(objectives):
+            stitch_cuts(
+                results[variant],
+                cuts,
+                counters[variant],
+                blob_size_threshold,
+                grain_axis,
+                executor,
+                coeffs=coeffs,
+                field_shape=s_field.shape,
+                bias_type=bias_type,
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return dict(zip(variants, results))
+
+
+def report_exploration(
+    s_field: VoxelField,
+    layouts: Dict[Variant, VoxelField],
+    chosen: Optional[Variant] = None,
+    out: TextIO = sys.stderr,
+):
+    """Beams along every axis, 1m blocks left and objective of every variant.
+
+    Objectives are each variant's own, so they only compare within a grain.
+    """
+    print(
+        f"  grain {'bias':<9} {'x beams':>8} {'y beams':>8} {'z beams':>8} "
+        f"{'1m':>8} {'objective':>12}",
+        file=out,
+    )
+    for (grain, bias), layout in layouts.items():
+        _, axes, lengths = layout_beams(layout)
+        beams_per_axis = np.bincount(axes[lengths > 1], minlength=3)
+        objective = layout_objective(s_field, layout, grain_coefficients(grain), bias)
+
+        marker = "*" if (grain, bias) == chosen else " "
+        x_beams, y_beams, z_beams = beams_per_axis
+        print(
+            f"{marker} {grain:>5} {bias:<9} {x_beams:>8} {y_beams:>8} {z_beams:>8} "
+            f"{np.count_nonzero(lengths == 1):>8} {objective:>12.2f}",
+            file=out,
+        )
@@ -0,0 +1,224 @@
+from hashlib import sha256
+from os import getpid, replace, utime
+from pathlib import Path
+from shutil import rmtree
+from typing import Iterable, List, Optional, Tuple
+
+import pickle
+
+import numpy as np
+import numpy.typing as npt
+
+from .blueprint import BLOCK_COLUMNS, BlockTable, GuidMap, GuidMapDef, parse_blueprint
+from .cache import user_cache_dir, write_atomically
+from .s_field import SegmentIndex, construct_s_field, index_armor_segments
+from .timing import Timings, timed
+from .voxel_field import VoxelField
+
+
+FIELD_CACHE_VERSION = 3
+# Least recently used entries are evicted past this many bytes of entries
+FIELD_CACHE_SIZE = 2**30
+
+BLOCK_TABLE_COLUMNS = ("coords", "guid_index", "color", "rot", "parent")
+
+# Blueprint document, block table, color map, s_field and armor segments
+PreparedBlueprint = Tuple[dict, BlockTable, npt.NDArray, VoxelField, SegmentIndex]
+
+
+def blueprint_key(bp_path: Path, exclude_4m_beams, exclude_colors: Iterable[int]):
+    """Hash of the blueprint's contents and of the options its s_field is built
+    with"""
+    digest = sha256(
+        f"{FIELD_CACHE_VERSION}:{exclude_4m_beams}:{sorted({*exclude_colors})}:".encode()
+    )
+    with bp_path.open("rb") as in_:
+        for chunk in iter(lambda: in_.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def guid_sizes(guid_entries: List[GuidMapDef]) -> npt.NDArray:
+    """SizeNeg and SizePos of every entry, which block footprints come from"""
+    return np.array(
+        [
+            [
+                entry["SizeInfo"][size_key][axis]  # type: ignore
+                for size_key in ("SizeNeg", "SizePos")
+                for axis in "xyz"
+            ]
+            for entry in guid_entries
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 6)
+
+
+class FieldCache:
+    """Parsed blueprints, with their s_field and armor segments, kept as .npy
+    files in the user cache directory and loaded memory-mapped.
+
+    Entries are keyed by `blueprint_key`, and are only used while the blocks of
+    the blueprint have the same sizes in the item database as when they were
+    stored.
+    """
+
+    def __init__(self, max_size=FIELD_CACHE_SIZE):
+        self.max_size = max_size
+        self.root = user_cache_dir() / f"fields-v{FIELD_CACHE_VERSION}"
+        self.root.mkdir(exist_ok=True)
+
+    def load(self, key: str, guid_map: GuidMap) -> Optional[PreparedBlueprint]:
+        entry = self.root / key
+        try:
+            with (entry / "meta.pickle").open("rb") as in_:
+                meta = pickle.load(in_)
+            guid_entries = [guid_map[guid] for guid in meta["guids"]]
+            if not np.array_equal(guid_sizes(guid_entries), meta["guid_sizes"]):
+                return None
+
+            arrays = {
+                name: np.load(entry / f"{name}.npy", mmap_mode="r")
+                for name in meta["arrays"]
+            }
+            # Entries are evicted by modification time, so mark this one as used
+            utime(entry)
+        except (OSError, EOFError, KeyError, ValueError, pickle.UnpicklingError):
+            return None
+
+        bp = meta["bp"]
+        for column in BLOCK_COLUMNS:
+            values = arrays[f"bp_{column}"]
+            if f"bp_{column}_nulls" in arrays:
+                values = np.ma.masked_array(values, mask=arrays[f"bp_{column}_nulls"])
+            bp["Blueprint"][column] = values
+        blocks = BlockTable(
+            guid_entries=guid_entries,
+            **{column: arrays[f"blocks_{column}"] for column in BLOCK_TABLE_COLUMNS},
+        )
+        s_field = VoxelField(
+            shape=meta["shape"],
+            keys=arrays["s_field_keys"],
+            values=arrays["s_field_values"],
+            origin=meta["origin"],
+        )
+        segments = dict(
+            zip(
+                meta["segment_ids"],
+                np.split(arrays["segment_voxels"], meta["segment_starts"][1:]),
+            )
+        )
+        return bp, blocks, meta["color_map"], s_field, segments
+
+    def store(self, key: str, prepared: PreparedBlueprint):
+        bp, blocks, color_map, s_field, segments = prepared
+
+        segment_lengths = np.array([len(voxels) for voxels in segments.values()])
+        columns = {column: bp["Blueprint"][column] for column in BLOCK_COLUMNS}
+        arrays = {
+            **{f"bp_{column}": np.ma.getdata(columns[column]) for column in columns},
+            # .npy files don't keep masks, so nulls get stored on their own
+            **{
+                f"bp_{column}_nulls": np.ma.getmaskarray(values)
+                for column, values in columns.items()
+                if np.ma.is_masked(values)
+            },
+            **{
+                f"blocks_{column}": getattr(blocks, column)
+                for column in BLOCK_TABLE_COLUMNS
+            },
+            "s_field_keys": s_field.keys,
+            "s_field_values": s_field.values,
+            "segment_voxels": np.concatenate(
+                [*segments.values(), np.zeros(0, dtype=np.int64)]
+            ),
+        }
+        meta = {
+            # Columns are left out of the document, but keep their place in it
+            "bp": {
+                **bp,
+                "Blueprint": {
+                    member: None if member in BLOCK_COLUMNS else value
+                    for member, value in bp["Blueprint"].items()
+                },
+            },
+            "color_map": color_map,
+            "guids": blocks.guids,
+            "guid_sizes": guid_sizes(blocks.guid_entries),
+            "shape": s_field.shape,
+            "origin": s_field.origin,
+            "segment_ids": [*segments],
+            "segment_starts": np.cumsum(segment_lengths) - segment_lengths,
+            "arrays": [*arrays],
+        }
+
+        # Entries are written aside and moved in place whole
+        tmp_entry = self.root / f"{key}.tmp{getpid()}"
+        try:
+            tmp_entry.mkdir()
+            for name, array in arrays.items():
+                np.save(tmp_entry / f"{name}.npy", array)
+            write_atomically(tmp_entry / "meta.pickle", meta)
+            # A stale entry of the same blueprint is in the way
+            rmtree(self.root / key, ignore_errors=True)
+            replace(tmp_entry, self.root / key)
+            self.evict(keep=key)
+        except OSError:
+            rmtree(tmp_entry, ignore_errors=True)
+
+    def evict(self, keep: str):
+        """Remove least recently used entries, other than `keep`, down to the
+        size limit"""
+        entries = sorted(
+            (entry for entry in self.root.iterdir() if ".tmp" not in entry.name),
+            key=lambda entry: (entry.name != keep, -entry.stat().st_mtime),
+        )
+        kept_size = 0
+        for entry in entries:
+            kept_size += sum(path.stat().st_size for path in entry.iterdir())
+            if kept_size > self.max_size and entry.name != keep:
+                rmtree(entry, ignore_errors=True)
+
+
+def prepare_blueprint(
+    bp_path: Path,
+    guid_map: GuidMap,
+    exclude_4m_beams=False,
+    exclude_colors: Iterable[int] = (),
+    use_cache=True,
+    timings: Optional[Timings] = None,
+) -> PreparedBlueprint:
+    """Parse the blueprint at `bp_path` and build its s_field and armor segment
+    index, or load them from the field cache if it was seen before"""
+    timings = {} if timings is None else timings
+
+    cache = None
+    if use_cache:
+        try:
+            cache = FieldCache()
+        except OSError:
+            # Without a usable cache directory, run as if caching were off
+            pass
+
+    if cache is not None:
+        with timed(timings, "field cache load"):
+            key = blueprint_key(bp_path, exclude_4m_beams, exclude_colors)
+            prepared = cache.load(key, guid_map)
+        if prepared is not None:
+            return prepared
+
+    with timed(timings, "blueprint parse"):
+        bp, blocks, color_map = parse_blueprint(
+            bp_path,
+            guid_map,
+            with_subconstructs=False,
+        )
+
+    with timed(timings, "s_field"):
+        s_field = construct_s_field(blocks, exclude_4m_beams, exclude_colors)
+        segments = index_armor_segments(s_field)
+
+    prepared = bp, blocks, color_map, s_field, segments
+    if cache is not None:
+        with timed(timings, "field cache write"):
+            cache.store(key, prepared)
+    return prepared
@@ -0,0 +1,175 @@
+import numpy as np
+import numpy.typing as npt
+
+from .voxel_field import VoxelField
+
+
+def runs_along(
+    segment_ids: npt.NDArray, coords: npt.NDArray, free: npt.NDArray, axis: int
+):
+    """Maximal runs of free voxels of the same segment along `axis`.
+
+    Returns the free voxels sorted run by run, each voxel's run and position
+    within it, and the length of every run.
+    """
+    voxels = np.flatnonzero(free)
+    coords = coords[voxels]
+    other_axes = [other for other in range(3) if other != axis]
+
+    order = np.lexsort(
+        (
+            coords[:, axis],
+            coords[:, other_axes[1]],
+            coords[:, other_axes[0]],
+            segment_ids[voxels],
+        )
+    )
+    voxels = voxels[order]
+    coords = coords[order]
+
+    continues_run = np.zeros(len(voxels), dtype=bool)
+    continues_run[1:] = (
+        (segment_ids[voxels[1:]] == segment_ids[voxels[:-1]])
+        & np.all(coords[1:, other_axes] == coords[:-1, other_axes], axis=1)
+        & (coords[1:, axis] == coords[:-1, axis] + 1)
+    )
+
+    run_ids = np.cumsum(~continues_run) - 1
+    run_starts = np.flatnonzero(~continues_run)
+    run_lengths = np.diff(run_starts, append=len(voxels))
+
+    positions = np.arange(len(voxels)) - run_starts[run_ids]
+    return voxels, run_ids, positions, run_lengths
+
+
+def repair_leftovers(
+    s_field: VoxelField,
+    coords: npt.NDArray,
+    result: VoxelField,
+    free: npt.NDArray,
+    beam_axes: npt.NDArray,
+    beam_lengths: npt.NDArray,
+    counter: int,
+) -> int:
+    """Fold voxels left free into neighbouring beams of the same segment.
+
+    A free voxel either lengthens an in-line beam shorter than 4m, or pairs up
+    with an end voxel of a beam of 3m or more to form a new 2m beam. Both moves
+    always improve the objective, since they get rid of a 1m block.
+    """
+    unit_steps = np.eye(3, dtype=np.int64)
+
+    def beam_at(voxels):
+        return np.where(voxels >= 0, result.values[voxels], 0)
+
+    changed = True
+    while changed:
+        changed = False
+        for axis in range(3):
+            for sign in (1, -1):
+                leftovers = np.flatnonzero(free)
+                neighbours = s_field.index_of(
+                    coords[leftovers] + sign * unit_steps[axis]
+                )
+                beams = beam_at(neighbours)
+                usable = (beams > 0) & (
+                    s_field.values[neighbours] == s_field.values[leftovers]
+                )
+                leftovers, neighbours, beams = (
+                    leftovers[usable],
+                    neighbours[usable],
+                    beams[usable],
+                )
+
+                in_line = beam_axes[beams] == axis
+                extend = in_line & (beam_lengths[beams] < 4)
+
+                # An in-line neighbour is always the end of its beam facing us
+                beam_steps = unit_steps[beam_axes[beams]]
+                is_end = (
+                    in_line
+                    | (
+                        beam_at(s_field.index_of(coords[neighbours] - beam_steps))
+                        != beams
+                    )
+                    | (
+                        beam_at(s_field.index_of(coords[neighbours] + beam_steps))
+                        != beams
+                    )
+                )
+                steal = ~extend & (beam_lengths[beams] >= 3) & is_end
+
+                # Touch every beam at most once per step to keep moves independent
+                acting = np.flatnonzero(extend | steal)
+                acting = acting[np.unique(beams[acting], return_index=True)[1]]
+                if not len(acting):
+                    continue
+                changed = True
+
+                extending = acting[extend[acting]]
+                result.values[leftovers[extending]] = beams[extending]
+                beam_lengths[beams[extending]] += 1
+
+                stealing = acting[steal[acting]]
+                new_beams = counter + np.arange(len(stealing))
+                result.values[leftovers[stealing]] = new_beams
+                result.values[neighbours[stealing]] = new_beams
+                beam_axes[new_beams] = axis
+                beam_lengths[new_beams] = 2
+                beam_lengths[beams[stealing]] -= 1
+                counter += len(stealing)
+
+                free[leftovers[acting]] = False
+
+    return counter
+
+
+def greedy_beamify(s_field: VoxelField, grain_directions="zxy") -> VoxelField:
+    """Fast heuristic alternative to `beamify` for crafts too big for the MILP.
+
+    Lays 4m beams along every axis in grain priority order, then 3m and 2m
+    beams, in the runs of voxels still free. Voxels left over are folded into
+    neighbouring beams where possible, and the rest become 1m blocks.
+    """
+    result = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+    free = s_field.values != 0
+    coords = s_field.coords
+    counter = 1
+
+    # Every beam gets a label, so there can never be more labels than voxels
+    beam_axes = np.zeros(len(s_field) + 1, dtype=np.int8)
+    beam_lengths = np.zeros(len(s_field) + 1, dtype=np.int8)
+
+    axes = ["xyz".index(direction) for direction in grain_directions]
+    for length in (4, 3, 2):
+        for axis in axes:
+            voxels, run_ids, positions, run_lengths = runs_along(
+                s_field.values, coords, free, axis
+            )
+
+            beam_counts = run_lengths // length
+            if length > 2:
+                # A lone leftover voxel would end up a 1m block, so give up one beam
+                # to leave shorter beams room to cover it instead
+                beam_counts[(run_lengths % length == 1) & (beam_counts > 0)] -= 1
+            first_beams = counter + np.cumsum(beam_counts) - beam_counts
+
+            placed = positions < beam_counts[run_ids] * length
+            result.values[voxels[placed]] = (
+                first_beams[run_ids[placed]] + positions[placed] // length
+            )
+            free[voxels[placed]] = False
+
+            new_beams = slice(counter, counter + int(beam_counts.sum()))
+            beam_axes[new_beams] = axis
+            beam_lengths[new_beams] = length
+            counter = new_beams.stop
+
+    counter = repair_leftovers(
+        s_field, coords, result, free, beam_axes, beam_lengths, counter
+    )
+
+    leftovers = np.flatnonzero(free)
+    result.values[leftovers] = counter + np.arange(len(leftovers))
+
+    return result
@@ -0,0 +1,93 @@
+from typing import Callable
+
+import numpy as np
+import numpy.typing as npt
+
+from .blueprint import BlockTable
+from .voxel_field import VoxelField
+
+
+# Voxels this close to a change get solved again, even if they didn't change
+REBEAMIFY_MARGIN = 2
+
+
+def block_layout(blocks: BlockTable, s_field: VoxelField) -> VoxelField:
+    """Beams as they stand on a craft, labelling every voxel by its block"""
+    voxels = s_field.index_of(blocks.coords - s_field.origin)
+    found = voxels >= 0
+
+    layout = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+    layout.values[voxels[found]] = blocks.parent[found].astype(np.int64) + 1
+    return layout
+
+
+def dilate(coords: npt.NDArray, margin: int) -> npt.NDArray:
+    """Every coordinate within `margin` of `coords` along each axis"""
+    for axis in range(3):
+        steps = np.zeros((2 * margin + 1, 3), dtype=np.int64)
+        steps[:, axis] = np.arange(-margin, margin + 1)
+        coords = np.unique((coords[:, None] + steps).reshape(-1, 3), axis=0)
+    return coords
+
+
+def carry_over_beams(
+    s_field: VoxelField,
+    previous: VoxelField,
+    layout: VoxelField,
+    margin=REBEAMIFY_MARGIN,
+) -> VoxelField:
+    """Labels of the beams of `layout`, laid over the `previous` field, that are
+    still valid on `s_field`, with 0 everywhere else.
+
+    A beam is kept if every one of its voxels is still of the same segment, and
+    no voxel of it is within `margin` of a voxel that changed.
+    """
+    shift = np.subtract(previous.origin, s_field.origin)
+    previous_coords = previous.coords + shift
+
+    here = s_field.index_of(previous_coords)
+    unchanged_previous = here >= 0
+    unchanged_previous[unchanged_previous] = (
+        s_field.values[here[unchanged_previous]] == previous.values[unchanged_previous]
+    )
+
+    there = previous.index_of(s_field.coords - shift)
+    unchanged = there >= 0
+    unchanged[unchanged] = (
+        previous.values[there[unchanged]] == s_field.values[unchanged]
+    )
+
+    changed_coords = np.concatenate(
+        (previous_coords[~unchanged_previous], s_field.coords[~unchanged])
+    )
+    dirty_voxels = s_field.index_of(dilate(changed_coords, margin))
+    dirty = np.zeros(len(s_field), dtype=bool)
+    dirty[dirty_voxels[dirty_voxels >= 0]] = True
+
+    valid = unchanged_previous
+    valid[valid] = ~dirty[here[valid]]
+    invalid_beams = np.unique(layout.values[~valid])
+    kept = valid & ~np.isin(layout.values, invalid_beams)
+
+    result = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+    result.values[here[kept]] = layout.values[kept]
+    return result
+
+
+def rebeamify(
+    s_field: VoxelField,
+    previous: VoxelField,
+    layout: VoxelField,
+    solve: Callable[[VoxelField], VoxelField],
+) -> VoxelField:
+    """Beamify `s_field` keeping what's still valid of the beams laid out on an
+    earlier version of it. Only the rest of it is given to `solve`."""
+    result = carry_over_beams(s_field, previous, layout)
+
+    rest = (s_field.values != 0) & (result.values == 0)
+    if not rest.any():
+        return result
+
+    rest_result = solve(s_field.with_values(np.where(rest, s_field.values, 0)))
+    result.values[rest] = rest_result.values[rest] + int(result.values.max())
+    return result
@@ -0,0 +1,113 @@
+from typing import Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .coefficients import BIAS_TYPES, blob_coefficients
+from .greedy import runs_along
+from .voxel_field import VoxelField
+
+
+def tile_runs(
+    piece_costs: npt.NDArray, positions: npt.NDArray, run_lengths: npt.NDArray
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    """Cheapest tiling of every run with pieces of 1 to 4 voxels.
+
+    `piece_costs[i, length - 1]` is the cost of a piece of `length` starting at
+    voxel `i`, with voxels sorted run by run. All runs advance in lockstep, one
+    position at a time. Returns the first voxel and the length of every piece.
+    """
+    # best[i + 1] is the cheapest tiling of voxel i's run up to and including it
+    best = np.zeros(len(positions) + 1)
+    choice = np.zeros(len(positions), dtype=np.int64)
+
+    position_counts = np.bincount(positions)
+    by_position = np.split(
+        np.argsort(positions, kind="stable"), np.cumsum(position_counts)[:-1]
+    )
+    for position, ends in enumerate(by_position):
+        candidates = np.full((len(ends), 4), np.inf)
+        for length in range(1, min(position + 1, 4) + 1):
+            first = ends - length + 1
+            previous = best[first] if position >= length else 0
+            candidates[:, length - 1] = previous + piece_costs[first, length - 1]
+
+        choice[ends] = np.argmin(candidates, axis=1) + 1
+        best[ends + 1] = np.min(candidates, axis=1)
+
+    # Walk every run back from its last voxel
+    piece_starts = [np.array([], dtype=np.int64)]
+    piece_lengths = [np.array([], dtype=np.int64)]
+    current = np.cumsum(run_lengths) - 1
+    run_starts = current - run_lengths + 1
+    while len(current):
+        lengths = choice[current]
+        first = current - lengths + 1
+        piece_starts.append(first)
+        piece_lengths.append(lengths)
+
+        continuing = first > run_starts
+        current = first[continuing] - 1
+        run_starts = run_starts[continuing]
+
+    return np.concatenate(piece_starts), np.concatenate(piece_lengths)
+
+
+def solve_lanes(
+    s_field: VoxelField,
+    coeffs: Tuple[float, float, float, float, float, float, float, float, float, float],
+    axis: int,
+    bias_type: BIAS_TYPES = "random",
+) -> VoxelField:
+    """Tile every maximal run of a segment along `axis` exactly, without a MILP.
+
+    Beams along the primary grain axis carry most of the objective, so this
+    settles the bulk of a hull up front. Lone voxels would rather be joined
+    across lanes, so they are left out, together with every lane touching them,
+    for the MILP to handle. Every lane is only tiled at its best on its own, so
+    the overall layout can be worse than the MILP's. Returns labels of the beams
+    settled here, 0 elsewhere.
+    """
+    coords = s_field.coords
+    voxels, run_ids, positions, run_lengths = runs_along(
+        s_field.values, coords, s_field.values != 0, axis
+    )
+
+    costs = blob_coefficients(coords[voxels], coeffs, s_field.shape, bias_type)
+    lane_configurations = [0, 3 * axis + 1, 3 * axis + 2, 3 * axis + 3]
+    piece_costs = costs.reshape(-1, 10)[:, lane_configurations]
+    piece_starts, piece_lengths = tile_runs(piece_costs, positions, run_lengths)
+
+    # Release lanes holding a lone voxel, as well as lanes next to one
+    lone = voxels[piece_starts[piece_lengths == 1]]
+    released_voxels = [lone]
+    for other_axis in range(3):
+        if other_axis == axis:
+            continue
+        for sign in (1, -1):
+            step = np.zeros(3, dtype=np.int64)
+            step[other_axis] = sign
+            neighbours = s_field.index_of(coords[lone] + step)
+            same_segment = neighbours >= 0
+            same_segment[same_segment] = (
+                s_field.values[neighbours[same_segment]]
+                == s_field.values[lone[same_segment]]
+            )
+            released_voxels.append(neighbours[same_segment])
+
+    run_of_voxel = np.empty(len(s_field), dtype=np.int64)
+    run_of_voxel[voxels] = run_ids
+    released_runs = np.zeros(len(run_lengths), dtype=bool)
+    released_runs[run_of_voxel[np.concatenate(released_voxels)]] = True
+
+    settled = ~released_runs[run_ids[piece_starts]]
+    piece_starts, piece_lengths = piece_starts[settled], piece_lengths[settled]
+
+    result = s_field.with_values(np.zeros(len(s_field), dtype=np.int64))
+    labels = np.repeat(np.arange(1, len(piece_starts) + 1), piece_lengths)
+    steps = np.arange(len(labels)) - np.repeat(
+        np.cumsum(piece_lengths) - piece_lengths, piece_lengths
+    )
+    result.values[voxels[np.repeat(piece_starts, piece_lengths) + steps]] = labels
+
+    return result
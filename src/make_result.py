@@ -1,110 +1,159 @@
-import json
-from typing import List
+from typing import Any, Dict, Iterable, List, Sequence, TextIO
 
-from scipy.ndimage import value_indices
+import json
 
 import numpy as np
 import numpy.typing as npt
 
-from .blueprint import Block, GuidMap
-from .s_field import ARMOR_BLOCK_FAMILIES
+from .beamification import layout_beams
+from .blueprint import BlockTable, GuidMap, parse_vectors
+from .s_field import ARMOR_BLOCK_FAMILIES, ARMOR_LOOKUP, LOOKUP_ORDER
+from .voxel_field import VoxelField
+
+
+MAX_BEAM_LENGTH = 4
+# Block rotation (BLR) of beams laid along X, Y and Z
+AXIS_ROTATIONS = np.array([1, 8, 0])
+
+# Elements of a blueprint column encoded at a time
+COLUMN_CHUNK_SIZE = 2**16
+
+
+def beam_guid_table(guid_map: GuidMap, families: Iterable[int]) -> npt.NDArray:
+    """GUID of the block of every armor family in `families` and every length,
+    indexed by `LOOKUP_ORDER` index and length in metres, None elsewhere"""
+    table = np.full((len(LOOKUP_ORDER), MAX_BEAM_LENGTH + 1), None, dtype=object)
+    for family in families:
+        for child, parent in ARMOR_BLOCK_FAMILIES.items():
+            if parent != LOOKUP_ORDER[family]:
+                continue
+            length = guid_map[child]["SizeInfo"]["SizePos"]["z"] + 1  # type: ignore
+            if length <= MAX_BEAM_LENGTH and table[family, length] is None:
+                table[family, length] = child
+    return table
+
+
+def encode_array(value):
+    """JSON of the block columns of subconstructs, BLP rows as "x,y,z" strings"""
+    if isinstance(value, np.ndarray) and value.ndim == 2:
+        return [f"{x},{y},{z}" for x, y, z in value.tolist()]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# Blueprints are written compactly, like the game writes them
+JSON_ENCODER = json.JSONEncoder(separators=(",", ":"), default=encode_array)
+
+
+def encode_elements(elements: Sequence) -> str:
+    """JSON of a run of column elements, without the brackets. Rows of 2D
+    arrays are vectors, encoded as "x,y,z" strings. Masked elements are nulls."""
+    if np.ma.isMaskedArray(elements):
+        return JSON_ENCODER.encode(elements.tolist())[1:-1]
+    if isinstance(elements, np.ndarray) and elements.ndim == 2:
+        return ",".join(f'"{x},{y},{z}"' for x, y, z in elements.tolist())
+    if isinstance(elements, np.ndarray) and elements.dtype.kind in "iu":
+        return ",".join(map(str, elements.tolist()))
+    if isinstance(elements, np.ndarray):
+        elements = elements.tolist()
+    return JSON_ENCODER.encode(elements)[1:-1]
+
+
+def write_column(output: TextIO, parts: List[Sequence]):
+    """Write the concatenation of `parts` as a JSON array, a chunk at a time"""
+    output.write("[")
+    separator = ""
+    for part in parts:
+        for start in range(0, len(part), COLUMN_CHUNK_SIZE):
+            output.write(separator)
+            output.write(encode_elements(part[start : start + COLUMN_CHUNK_SIZE]))
+            separator = ","
+    output.write("]")
+
+
+def write_object(output: TextIO, members: Dict[str, Any], streamed: Dict[str, Any]):
+    """Write `members` as a compact JSON object. Members named in `streamed` are
+    written from there instead, columns by `write_column` and dicts of them
+    into the member's own object. Other lists are written a chunk at a time."""
+    output.write("{")
+    for i, (key, value) in enumerate(members.items()):
+        output.write(f"{',' if i else ''}{JSON_ENCODER.encode(key)}:")
+        if isinstance(streamed.get(key), dict):
+            write_object(output, value, streamed[key])
+        elif key in streamed:
+            write_column(output, streamed[key])
+        elif isinstance(value, list):
+            # Lists such as subconstructs can be big too
+            write_column(output, [value])
+        else:
+            output.write(JSON_ENCODER.encode(value))
+    output.write("}")
 
 
 def make_bp_from_field(
-    field: npt.NDArray, guid_map: GuidMap, blocks: List[Block], og_bp
+    field: VoxelField,
+    guid_map: GuidMap,
+    blocks: BlockTable,
+    og_bp,
+    output: TextIO,
 ):
-    coords_taken = np.array([block.coord for block in blocks])
-
-    x_min, y_min, z_min = map(int, np.min(coords_taken, axis=0))
-
-    # Let's try to construct the vessel
-    coord_block_lookup = {tuple(block.coord): block for block in blocks}
-    block_family_lookup = {
-        parent: [
-            child
-            for child, maybe_parent in ARMOR_BLOCK_FAMILIES.items()
-            if maybe_parent == parent
-        ]
-        for parent in {*ARMOR_BLOCK_FAMILIES.values()}
-    }
-
-    new_blocks = []
-    for xx, yy, zz in value_indices(field, ignore_value=0).values():
-        size = len(xx)
-
-        blr = 0
-        if size > 1:
-            is_left_to_right = xx[0] < xx[-1]
-            is_up_to_down = yy[0] < yy[-1]
-            is_back_to_forward = zz[0] < zz[-1]
-
-            blr = is_left_to_right and 1 or is_up_to_down and 8 or 0
-
-        origin = (x_min + xx[0], y_min + yy[0], z_min + zz[0])
-        repl_block = coord_block_lookup[origin]
-
-        parent = ARMOR_BLOCK_FAMILIES[repl_block.guid]
-        children = block_family_lookup[parent]
-
-        new_guid = [
-            child
-            for child in children
-            if guid_map[child]["SizeInfo"]["SizePos"]["z"] == size - 1  # type: ignore
-        ][0]
-
-        color = repl_block.color
-
-        new_blocks.append((origin, new_guid, blr, color))
-
-    beamified_bp = og_bp.copy()
-    removed_indices = set()
-    for i, coord in enumerate(beamified_bp["Blueprint"]["BLP"]):
-        x, y, z = map(int, coord.split(","))
-
-        if field[x - x_min, y - y_min, z - z_min] > 0:
-            removed_indices.add(i)
-
-    item_dict_reverse_lookup = {
-        guid: int(num) for num, guid in beamified_bp["ItemDictionary"].items()
-    }
+    """Write the blueprint of `og_bp` with the beams laid out in `field` in place
+    of the armor it covers to `output`. `og_bp` is left as it is."""
+    origins, axes, lengths = layout_beams(field)
+    origins = origins + field.origin
+
+    # Block row of every beam's first voxel, later rows winning like they would
+    # on the craft
+    rows = np.arange(len(blocks))
+    local_coords = blocks.coords - field.origin
+    in_field = np.all((local_coords >= 0) & (local_coords < field.shape), axis=1)
+    row_field = VoxelField.from_coords(
+        field.shape, local_coords[in_field], rows[in_field], field.origin
+    )
+    beam_rows = row_field.lookup(origins - field.origin, default=-1)
 
-    guids_used = {guid for _, guid, _, _ in new_blocks}
+    guid_families = np.array([ARMOR_LOOKUP.get(guid, -1) for guid in blocks.guids])
+    families = guid_families[blocks.guid_index[beam_rows]]
+    guid_table = beam_guid_table(guid_map, np.unique(families))
 
-    missing_guids = guids_used - {*item_dict_reverse_lookup.keys()}
-    used_keys = {*item_dict_reverse_lookup.values()}
+    item_ids = {guid: int(num) for num, guid in og_bp["ItemDictionary"].items()}
     free_id = 1
-
-    for missing_guid in missing_guids:
-        while free_id in used_keys:
-            free_id += 1
-        item_dict_reverse_lookup[missing_guid] = free_id
-        used_keys.add(free_id)
+    id_table = np.zeros(guid_table.shape, dtype=np.int64)
+    # Ids are handed out by GUID, so they don't depend on how families are numbered
+    for (family, length), guid in sorted(
+        np.ndenumerate(guid_table), key=lambda entry: str(entry[1])
+    ):
+        if guid is None:
+            continue
+        if guid not in item_ids:
+            while free_id in item_ids.values():
+                free_id += 1
+            item_ids[guid] = free_id
+        id_table[family, length] = item_ids[guid]
+
+    og_blueprint = og_bp["Blueprint"]
+    bp_coords = np.rint(og_blueprint["BLP"]).astype(np.int64)
+    removed = np.flatnonzero(field.lookup(bp_coords - field.origin) > 0)
 
     # Time to move affected blocks up so they fall down
-    up_shift = int(beamified_bp["Blueprint"]["MaxCords"].split(",")[1]) - int(
-        beamified_bp["Blueprint"]["MinCords"].split(",")[1]
-    )
-
-    for removed_indx in removed_indices:
-        coord_string = beamified_bp["Blueprint"]["BLP"][removed_indx]
-        x, y, z = map(int, coord_string.split(","))
-
-        new_coord_string = f"{x},{y+up_shift+10},{z}"
-
-        beamified_bp["Blueprint"]["BLP"][removed_indx] = new_coord_string
-
-    for (x, y, z), guid, rotation, color in new_blocks:
-        coord_string = f"{x},{y},{z}"
-        item_id = item_dict_reverse_lookup[guid]
-
-        beamified_bp["Blueprint"]["BLP"].append(coord_string)
-        beamified_bp["Blueprint"]["BLR"].append(rotation)
-        beamified_bp["Blueprint"]["BCI"].append(color)
-        beamified_bp["Blueprint"]["BlockIds"].append(item_id)
-
-    new_item_dict = {
-        str(item_id): guid for guid, item_id in item_dict_reverse_lookup.items()
+    min_y, max_y = np.rint(
+        parse_vectors([og_blueprint["MinCords"], og_blueprint["MaxCords"]])[:, 1]
+    ).astype(int)
+    up_shift = max_y - min_y + 10
+
+    blp = og_blueprint["BLP"].copy()
+    blp[removed] += (0, up_shift, 0)
+
+    columns = {
+        "BLP": [blp, origins],
+        "BLR": [og_blueprint["BLR"], np.where(lengths > 1, AXIS_ROTATIONS[axes], 0)],
+        "BCI": [og_blueprint["BCI"], blocks.color[beam_rows]],
+        "BlockIds": [og_blueprint["BlockIds"], id_table[families, lengths]],
+    }
+    beamified_bp = {
+        **og_bp,
+        "ItemDictionary": {str(item_id): guid for guid, item_id in item_ids.items()},
     }
-    beamified_bp["ItemDictionary"] = new_item_dict
 
-    return json.dumps(beamified_bp)
+    write_object(output, beamified_bp, {"Blueprint": columns})
@@ -1,7 +1,10 @@
-from typing import List
+from typing import Dict, Optional
+
 import numpy as np
+import numpy.typing as npt
 
-from .blueprint import Block
+from .blueprint import BlockTable
+from .voxel_field import VoxelField
 
 
 ARMOR_BLOCK_FAMILIES = {
@@ -53,7 +56,8 @@ ARMOR_BLOCK_FAMILIES = {
     for child in children
 }
 
-LOOKUP_ORDER = [*{*ARMOR_BLOCK_FAMILIES.values()}]
+# Family indices end up in cached fields, so they must not change from run to run
+LOOKUP_ORDER = sorted({*ARMOR_BLOCK_FAMILIES.values()})
 ARMOR_LOOKUP = {
     block: LOOKUP_ORDER.index(parent) for block, parent in ARMOR_BLOCK_FAMILIES.items()
 }
@@ -70,30 +74,52 @@ BEAMS_4M = {
 
 
 def construct_s_field(
-    blocks: List[Block],
+    blocks: BlockTable,
     exclude_4m_beams=False,
     exclude_colors=[],
 ):
-    coords_taken = np.array([block.coord for block in blocks])
+    coords_taken = blocks.coords
 
     x_min, y_min, z_min = map(int, np.min(coords_taken, axis=0))
     x_max, y_max, z_max = map(int, np.max(coords_taken, axis=0))
 
     x_len, y_len, z_len = x_max - x_min + 1, y_max - y_min + 1, z_max - z_min + 1
 
-    s_field = np.full((x_len, y_len, z_len), 0)
+    guids = blocks.guids
+    armor_families = np.array([ARMOR_LOOKUP.get(guid, -1) for guid in guids])
+    is_4m_beam = np.array([guid in BEAMS_4M for guid in guids], dtype=bool)
+
+    family = armor_families[blocks.guid_index]
+    eligible = family >= 0
+    if exclude_4m_beams:
+        eligible &= ~is_4m_beam[blocks.guid_index]
+    eligible &= ~np.isin(blocks.color, [*exclude_colors])
+
+    return VoxelField.from_coords(
+        (x_len, y_len, z_len),
+        coords_taken[eligible] - (x_min, y_min, z_min),
+        32 * family[eligible].astype(np.int64) + blocks.color[eligible] + 1,
+        origin=(x_min, y_min, z_min),
+    )
+
+
+SegmentIndex = Dict[int, npt.NDArray]
+
 
-    for block in blocks:
-        x, y, z = map(int, block.coord)
-        x -= x_min
-        y -= y_min
-        z -= z_min
+def index_armor_segments(
+    s_field: VoxelField, previous: Optional[SegmentIndex] = None
+) -> SegmentIndex:
+    """Voxel indices of every armor segment (same family and color).
 
-        if block.guid in ARMOR_LOOKUP:
-            if exclude_4m_beams and block.guid in BEAMS_4M:
-                continue
-            if block.color in exclude_colors:
-                continue
-            s_field[x, y, z] = 32 * ARMOR_LOOKUP[block.guid] + block.color + 1
+    Built in a single sort-based pass. Given the index of an earlier state of
+    the same field, it is updated instead by dropping voxels that were cleared.
+    """
+    if previous is None:
+        return s_field.value_indices()
 
-    return s_field
+    segments = {}
+    for armor_segment_id, voxels in previous.items():
+        voxels = voxels[s_field.values[voxels] == armor_segment_id]
+        if len(voxels):
+            segments[armor_segment_id] = voxels
+    return segments
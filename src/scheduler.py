@@ -0,0 +1,160 @@
+from time import perf_counter
+from typing import Optional
+
+import pickle
+
+import numpy as np
+import numpy.typing as npt
+
+from .cache import user_cache_dir, write_atomically
+
+
+# Fixed per-blob time limit when there's no time budget to spread
+DEFAULT_TIME_LIMIT = 15
+
+SOLVE_HISTORY_VERSION = 1
+# Only the most recent solves are kept, so the history follows solver upgrades
+SOLVE_HISTORY_LENGTH = 5000
+
+# log(seconds) ~ weights @ (1, log(nonzeros), log(variables / voxels), log(fill)).
+# Fitted on hull sections before there is any history to fit on.
+PRIOR_WEIGHTS = np.array([-10.1, 0.81, 0.0, 0.0])
+# How many solves' worth of evidence the prior weights count for
+PRIOR_STRENGTH = 10.0
+
+# Share of the remaining budget a pass may plan to spend on its first solves,
+# leaving the rest for stitching and later passes
+PASS_BUDGET_SHARE = 0.5
+MIN_BLOB_SIZE = 64
+# Blobs get this many times their predicted solve time, but at least
+# MIN_TIME_LIMIT seconds
+TIME_LIMIT_SLACK = 4.0
+MIN_TIME_LIMIT = 1.0
+
+
+def solve_features(stats: npt.NDArray) -> npt.NDArray:
+    """Regression features of rows of `blob_model_statistics`"""
+    voxels, variables, nonzeros, fill = np.atleast_2d(stats).T
+    return np.column_stack(
+        (
+            np.ones(len(voxels)),
+            np.log(nonzeros),
+            np.log(variables / voxels),
+            np.log(fill),
+        )
+    )
+
+
+class SolveHistory:
+    """Observed blob solve times, stored alongside the model statistics of each
+    blob in the user cache directory"""
+
+    def __init__(self, records: Optional[npt.NDArray] = None):
+        # Rows of `blob_model_statistics` followed by the solve time in seconds
+        self.records = np.zeros((0, 5)) if records is None else records
+
+    @staticmethod
+    def path():
+        return user_cache_dir() / "solve_history.pickle"
+
+    @classmethod
+    def load(cls) -> "SolveHistory":
+        try:
+            with cls.path().open("rb") as in_:
+                if pickle.load(in_) != SOLVE_HISTORY_VERSION:
+                    raise ValueError("Stale solve history")
+                return cls(pickle.load(in_))
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return cls()
+
+    def save(self):
+        try:
+            write_atomically(
+                self.path(),
+                SOLVE_HISTORY_VERSION,
+                self.records[-SOLVE_HISTORY_LENGTH:],
+            )
+        except OSError:
+            # The history only improves predictions, so losing it is harmless
+            pass
+
+    def record(self, stats: npt.NDArray, seconds: npt.NDArray):
+        self.records = np.concatenate(
+            (self.records, np.column_stack((np.atleast_2d(stats), seconds)))
+        )
+
+    def fit(self) -> npt.NDArray:
+        """Regression weights, pulled towards the prior while history is short"""
+        features = solve_features(self.records[:, :4])
+        seconds = np.maximum(self.records[:, 4], 1e-3)
+
+        regularizer = PRIOR_STRENGTH * np.eye(len(PRIOR_WEIGHTS))
+        return np.linalg.solve(
+            features.T @ features + regularizer,
+            features.T @ np.log(seconds) + regularizer @ PRIOR_WEIGHTS,
+        )
+
+
+class SolveScheduler:
+    """Spreads a time budget over the blob solves of a run.
+
+    Solve times are predicted from model statistics. They pick how big blobs
+    may be, and how long each one may take, so the run stays within budget.
+    """
+
+    def __init__(
+        self,
+        time_budget: float,
+        workers=1,
+        history: Optional[SolveHistory] = None,
+    ):
+        self.deadline = perf_counter() + time_budget
+        self.workers = workers
+        self.history = SolveHistory.load() if history is None else history
+        self.weights = self.history.fit()
+
+    def remaining(self) -> float:
+        return max(self.deadline - perf_counter(), 0.0)
+
+    def predict(self, stats: npt.NDArray) -> npt.NDArray:
+        """Predicted solve times, in seconds"""
+        return np.exp(solve_features(stats) @ self.weights)
+
+    def blob_size_threshold(self, component_stats: npt.NDArray) -> int:
+        """Largest blob size, halving down from the biggest component, at which
+        solving every component is predicted to fit the pass' budget.
+
+        If none fits, the size predicted to take the least time overall."""
+        component_stats = np.atleast_2d(component_stats)
+        sizes = component_stats[:, 0]
+        budget = PASS_BUDGET_SHARE * self.remaining() * self.workers
+
+        fastest, fastest_time = int(sizes.max()), np.inf
+        threshold = fastest
+        while True:
+            # Pieces are assumed to be like their component, only smaller
+            pieces = np.ceil(sizes / threshold)
+            piece_stats = component_stats / pieces[:, None]
+            piece_stats[:, 3] = component_stats[:, 3]
+
+            total_time = np.sum(pieces * self.predict(piece_stats))
+            if total_time <= budget:
+                return threshold
+            if total_time < fastest_time:
+                fastest, fastest_time = threshold, total_time
+
+            if threshold <= MIN_BLOB_SIZE:
+                return fastest
+            threshold = max(threshold // 2, MIN_BLOB_SIZE)
+
+    def time_limits(self, stats: npt.NDArray) -> npt.NDArray:
+        """Per-blob time limits, scaled down when they would overrun the budget"""
+        wanted = TIME_LIMIT_SLACK * self.predict(stats)
+        available = self.remaining() * self.workers
+        if wanted.sum() > available:
+            wanted *= available / wanted.sum()
+
+        return np.maximum(wanted, MIN_TIME_LIMIT)
+
+    def record(self, stats: npt.NDArray, seconds: npt.NDArray):
+        self.history.record(stats, seconds)
@@ -0,0 +1,129 @@
+from hashlib import sha256
+from time import time
+from typing import Optional, Tuple
+
+import sqlite3
+
+import numpy as np
+import numpy.typing as npt
+
+from .cache import user_cache_dir
+
+
+SOLUTION_CACHE_VERSION = 1
+# Least recently used solutions are evicted past this many bytes of solutions
+SOLUTION_CACHE_SIZE = 256 * 2**20
+
+
+def canonical_blob(blob: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray]:
+    """Blob moved to the origin with its voxels sorted, and the blob row of
+    every canonical voxel"""
+    local = blob - blob.min(axis=0)
+    order = np.lexsort(local.T[::-1])
+    return local[order], order
+
+
+class SolutionCache:
+    """Proven optimal blob layouts, kept in a SQLite database in the user cache
+    directory.
+
+    Blobs are keyed by their shape relative to their minimum corner and by their
+    objective, so they share a layout whenever the objective is the same. With
+    `random` bias it doesn't depend on where a blob is, so that is the same shape
+    anywhere on a craft, or on any other craft. `sided` and `alternate` biases
+    weigh beams by their place in the field, which can change which layout is
+    optimal, so their layouts are only reused at the same place in a field of
+    the same shape, like unchanged parts of a craft solved again.
+    """
+
+    def __init__(self, max_size=SOLUTION_CACHE_SIZE):
+        self.max_size = max_size
+        self.connection = sqlite3.connect(user_cache_dir() / "solutions.sqlite")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solutions ("
+            "key BLOB PRIMARY KEY, chosen BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS solutions_by_use ON solutions (last_used)"
+        )
+
+    @staticmethod
+    def key(blob: npt.NDArray, objective: npt.NDArray) -> Tuple[bytes, npt.NDArray]:
+        """Cache key of a blob with per-variable `objective`, and the canonical
+        order of its voxels"""
+        local, order = canonical_blob(blob)
+        digest = sha256(f"{SOLUTION_CACHE_VERSION}:".encode())
+        digest.update(local.astype(np.int32).tobytes())
+        digest.update(objective.reshape(-1, 10)[order].tobytes())
+        return digest.digest(), order
+
+    def get(self, key: bytes, order: npt.NDArray) -> Optional[npt.NDArray]:
+        row = self.connection.execute(
+            "SELECT chosen FROM solutions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        try:
+            self.connection.execute(
+                "UPDATE solutions SET last_used = ? WHERE key = ?", (time(), key)
+            )
+        except sqlite3.Error:
+            # A read-only cache still serves solutions
+            pass
+        voxels, configurations = np.divmod(np.frombuffer(row[0], dtype=np.int64), 10)
+        return 10 * order[voxels] + configurations
+
+    def put(self, key: bytes, order: npt.NDArray, chosen: npt.NDArray):
+        canonical_index = np.empty(len(order), dtype=np.int64)
+        canonical_index[order] = np.arange(len(order))
+        voxels, configurations = np.divmod(chosen, 10)
+
+        try:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)",
+                (
+                    key,
+                    (10 * canonical_index[voxels] + configurations)
+                    .astype(np.int64)
+                    .tobytes(),
+                    time(),
+                ),
+            )
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """Evict least recently used solutions down to the size limit and save"""
+        try:
+            (size,) = self.connection.execute(
+                "SELECT COALESCE(SUM(LENGTH(chosen)), 0) FROM solutions"
+            ).fetchone()
+            if size > self.max_size:
+                rows = self.connection.execute(
+                    "SELECT key, LENGTH(chosen) FROM solutions "
+                    "ORDER BY last_used DESC"
+                ).fetchall()
+                kept_size = np.cumsum([length for _, length in rows])
+                evicted = [
+                    (key,)
+                    for (key, _), kept in zip(rows, kept_size)
+                    if kept > self.max_size
+                ]
+                self.connection.executemany(
+                    "DELETE FROM solutions WHERE key = ?", evicted
+                )
+
+            self.connection.commit()
+        except sqlite3.Error:
+            pass
+        finally:
+            self.connection.close()
+
+
+def open_solution_cache() -> Optional[SolutionCache]:
+    """The solution cache, or None if the cache directory can't be used"""
+    try:
+        return SolutionCache()
+    except (OSError, sqlite3.Error):
+        return None
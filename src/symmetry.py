@@ -0,0 +1,147 @@
+from time import perf_counter
+from typing import Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .beamification import beamify
+from .voxel_field import VoxelField
+
+
+# Share of voxels that must have a mirror image of the same segment for a craft
+# to be treated as symmetric
+SYMMETRY_THRESHOLD = 0.95
+
+
+def find_mirror(s_field: VoxelField) -> Tuple[int, npt.NDArray, npt.NDArray]:
+    """Mirror image of every voxel across the X midplane of the armor.
+
+    Returns twice the X coordinate of the plane, the mirror voxel of every voxel
+    (-1 where there is none) and whether each voxel's mirror is of the same
+    segment.
+    """
+    coords = s_field.coords
+    occupied = s_field.values != 0
+    x = coords[:, 0]
+    plane = int(x[occupied].min(initial=0) + x[occupied].max(initial=0))
+
+    mirrored = coords.copy()
+    mirrored[:, 0] = plane - x
+    mirror = s_field.index_of(mirrored)
+
+    symmetric = occupied & (mirror >= 0)
+    symmetric[symmetric] = (
+        s_field.values[mirror[symmetric]] == s_field.values[symmetric]
+    )
+    return plane, mirror, symmetric
+
+
+def join_across_plane(
+    s_field: VoxelField,
+    result: VoxelField,
+    plane: int,
+    mirror: npt.NDArray,
+    symmetric: npt.NDArray,
+):
+    """Join beams touching the plane with their mirror image, where the joined
+    beam still fits in 4m. The joined beams are their own mirror images.
+
+    Every join replaces two or three beams by one along X, which always improves
+    the objective.
+    """
+    coords = s_field.coords
+    x = coords[:, 0]
+    beams = result.value_indices()
+    lengths = np.bincount(result.values)
+
+    def along_x(labels):
+        # A beam along X has its voxels at different X coordinates
+        return (lengths[labels] == 1) | np.array(
+            [x[beams[label]].min() != x[beams[label]].max() for label in labels],
+            dtype=bool,
+        )
+
+    if plane % 2:
+        # The plane lies between two columns, so a 1m or 2m beam ending next to
+        # it doubles up into a centered 2m or 4m beam
+        near = np.flatnonzero(symmetric & (2 * x == plane - 1))
+        labels = result.values[near]
+        joined = near[(lengths[labels] <= 2) & along_x(labels)]
+        for label in np.unique(result.values[joined]):
+            result.values[mirror[beams[label]]] = label
+        return
+
+    # The plane runs through a column, so a 1m block on it and its 1m
+    # neighbours on both sides make a centered 3m beam
+    on_plane = np.flatnonzero(symmetric & (2 * x == plane))
+    neighbours = s_field.index_of(coords[on_plane] - (1, 0, 0))
+    joined = neighbours >= 0
+    joined[joined] = (
+        symmetric[neighbours[joined]]
+        & (s_field.values[neighbours[joined]] == s_field.values[on_plane[joined]])
+        & (lengths[result.values[neighbours[joined]]] == 1)
+    )
+    joined &= lengths[result.values[on_plane]] == 1
+    result.values[on_plane[joined]] = result.values[neighbours[joined]]
+    result.values[mirror[neighbours[joined]]] = result.values[neighbours[joined]]
+
+
+def symmetric_beamify(
+    s_field: VoxelField, time_budget: Optional[float] = None, **kwargs
+) -> VoxelField:
+    """`beamify` for crafts mirror-symmetric about the X midplane.
+
+    Only the half left of the plane is solved, and its beams are mirrored onto
+    the other half. Voxels on the plane and voxels without a mirror image are
+    solved afterwards. Beams along X can't cross the plane, so the layout of a
+    symmetric craft comes out symmetric. Finally beams touching the plane are
+    joined with their mirror images where possible. Biases are evaluated at the
+    true position of the solved half, so the other half gets their mirror image.
+    A `time_budget` is shared by both solves.
+
+    Crafts that aren't symmetric enough are beamified as a whole.
+    """
+    occupied = s_field.values != 0
+    plane, mirror, symmetric = find_mirror(s_field)
+    if np.count_nonzero(symmetric) < SYMMETRY_THRESHOLD * np.count_nonzero(occupied):
+        return beamify(s_field, time_budget=time_budget, **kwargs)
+
+    x = s_field.coords[:, 0]
+    half = symmetric & (2 * x < plane)
+    # Voxels on the plane are their own mirror image. Their symmetric neighbours
+    # along X are already laid out, so they only get beams along Y and Z
+    rest = occupied & (~symmetric | (2 * x == plane))
+
+    # The budget is split by how many voxels each solve gets
+    deadline = None
+    half_budget = None
+    if time_budget is not None:
+        deadline = perf_counter() + time_budget
+        half_count = np.count_nonzero(half)
+        half_budget = (
+            time_budget * half_count / max(half_count + np.count_nonzero(rest), 1)
+        )
+
+    half_result = beamify(
+        s_field.with_values(np.where(half, s_field.values, 0)),
+        time_budget=half_budget,
+        **kwargs,
+    )
+
+    result = half_result
+    counter = int(half_result.values.max(initial=0))
+    result.values[mirror[half]] = half_result.values[half] + counter
+    counter *= 2
+
+    if np.any(rest):
+        rest_result = beamify(
+            s_field.with_values(np.where(rest, s_field.values, 0)),
+            time_budget=(
+                None if deadline is None else max(deadline - perf_counter(), 0.0)
+            ),
+            **kwargs,
+        )
+        result.values[rest] = rest_result.values[rest] + counter
+
+    join_across_plane(s_field, result, plane, mirror, symmetric)
+    return result
@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Optional, TextIO
+
+import sys
+
+
+Timings = Dict[str, float]
+
+
+@contextmanager
+def timed(timings: Optional[Timings], phase: str):
+    """Add the time spent inside the block to `timings[phase]`"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[phase] = timings.get(phase, 0.0) + perf_counter() - start
+
+
+def report_timings(timings: Timings, out: TextIO = sys.stderr):
+    width = max(map(len, timings), default=0)
+    for phase, seconds in timings.items():
+        print(f"{phase:<{width}} {seconds * 1000:10.1f} ms", file=out)
@@ -0,0 +1,96 @@
+from typing import Dict, Tuple
+
+from attr import attrib, attrs
+
+import numpy as np
+import numpy.typing as npt
+
+
+@attrs(auto_attribs=True, eq=False)
+class VoxelField:
+    """Sparse voxel field over a bounding box.
+
+    Only occupied voxels are stored, as sorted C-order linear keys into `shape`
+    with one value per voxel, so memory scales with the voxel count rather than
+    with the bounding box volume.
+    """
+
+    shape: Tuple[int, int, int]
+    keys: npt.NDArray
+    values: npt.NDArray
+    # World coordinate of the bounding box's (0, 0, 0) corner
+    origin: Tuple[int, int, int] = attrib(default=(0, 0, 0))
+
+    @classmethod
+    def from_coords(
+        cls,
+        shape: Tuple[int, int, int],
+        coords: npt.NDArray,
+        values: npt.NDArray,
+        origin: Tuple[int, int, int] = (0, 0, 0),
+    ) -> "VoxelField":
+        coords = np.asarray(coords, dtype=np.int64).reshape(-1, 3)
+        keys = np.ravel_multi_index(tuple(coords.T), shape)
+        # Later voxels win, just like repeated assignment into a dense array would
+        unique_keys, last_occurrence = np.unique(keys[::-1], return_index=True)
+        return cls(
+            shape=tuple(shape),
+            keys=unique_keys,
+            values=np.asarray(values)[::-1][last_occurrence],
+            origin=origin,
+        )
+
+    @classmethod
+    def from_dense(cls, field: npt.NDArray, origin=(0, 0, 0)) -> "VoxelField":
+        keys = np.flatnonzero(field)
+        return cls(shape=field.shape, keys=keys, values=field.flat[keys], origin=origin)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def coords(self) -> npt.NDArray:
+        return np.stack(np.unravel_index(self.keys, self.shape), axis=1)
+
+    def copy(self) -> "VoxelField":
+        return self.with_values(self.values.copy())
+
+    def with_values(self, values: npt.NDArray) -> "VoxelField":
+        """Field over the same voxels, holding other values"""
+        return VoxelField(
+            shape=self.shape, keys=self.keys, values=values, origin=self.origin
+        )
+
+    def index_of(self, coords: npt.NDArray) -> npt.NDArray:
+        """Voxel index of every coordinate row, -1 where there is no voxel"""
+        coords = np.asarray(coords).reshape(-1, 3)
+        inside = np.all((coords >= 0) & (coords < self.shape), axis=1)
+
+        keys = np.zeros(len(coords), dtype=np.int64)
+        keys[inside] = np.ravel_multi_index(tuple(coords[inside].T), self.shape)
+
+        indices = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = inside & (len(self.keys) > 0)
+        found[found] &= self.keys[indices[found]] == keys[found]
+        return np.where(found, indices, -1)
+
+    def lookup(self, coords: npt.NDArray, default=0) -> npt.NDArray:
+        indices = self.index_of(coords)
+        return np.where(indices >= 0, self.values[indices], default)
+
+    def value_indices(self, ignore_value=0) -> Dict[int, npt.NDArray]:
+        """Like `scipy.ndimage.value_indices`, but yields voxel indices"""
+        order = np.argsort(self.values, kind="stable")
+        sorted_values = self.values[order]
+        starts = np.flatnonzero(np.diff(sorted_values, prepend=~sorted_values[:1]))
+        groups = np.split(order, starts[1:])
+        return {
+            int(sorted_values[start]): group
+            for start, group in zip(starts, groups)
+            if sorted_values[start] != ignore_value
+        }
+
+    def to_dense(self) -> npt.NDArray:
+        field = np.zeros(self.shape, dtype=self.values.dtype)
+        field.flat[self.keys] = self.values
+        return field
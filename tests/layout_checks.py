@@ -0,0 +1,38 @@
+"""Checks of beam layouts shared by tests"""
+
+import numpy as np
+import numpy.typing as npt
+
+from src.voxel_field import VoxelField
+
+
+def assert_valid_layout(s_field: VoxelField, layout: VoxelField):
+    """Every armor voxel of `s_field` is covered by exactly one straight beam of
+    1 to 4 voxels in `layout`, within its segment, and nothing else is"""
+    assert layout.shape == s_field.shape
+    np.testing.assert_array_equal(layout.keys, s_field.keys)
+    np.testing.assert_array_equal(layout.values != 0, s_field.values != 0)
+
+    coords = layout.coords
+    for label, voxels in layout.value_indices().items():
+        if label == 0:
+            continue
+        assert len(np.unique(s_field.values[voxels])) == 1, f"beam {label}"
+
+        extents = np.ptp(coords[voxels], axis=0)
+        assert len(voxels) <= 4, f"beam {label}"
+        assert np.count_nonzero(extents) <= 1, f"beam {label}"
+        assert extents.max() == len(voxels) - 1, f"beam {label}"
+
+
+def assert_mirror_symmetric(layout: VoxelField, mirror: npt.NDArray):
+    """The mirror image of every beam in `layout` is a beam of it too"""
+    occupied = layout.values != 0
+    assert np.all(mirror[occupied] >= 0)
+
+    pairs = np.unique(
+        np.stack([layout.values[occupied], layout.values[mirror[occupied]]]), axis=1
+    )
+    # Beams map to beams exactly when labels pair up one to one
+    assert len(np.unique(pairs[0])) == pairs.shape[1]
+    assert len(np.unique(pairs[1])) == pairs.shape[1]
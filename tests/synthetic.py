@@ -0,0 +1,95 @@
+"""Synthetic crafts and item definitions for tests"""
+
+from pathlib import Path
+from typing import Dict, List
+
+import json
+
+import numpy as np
+
+from src.s_field import ARMOR_BLOCK_FAMILIES
+from src.voxel_field import VoxelField
+
+
+DECORATION_GUID = "00000000-0000-0000-0000-000000000001"
+
+
+def item(guid: str, length=1):
+    return {
+        "ComponentId": {"Guid": guid},
+        "SizeInfo": {
+            "SizePos": {"x": 0, "y": 0, "z": length - 1},
+            "SizeNeg": {"x": 0, "y": 0, "z": 0},
+        },
+    }
+
+
+def armor_families() -> Dict[str, List[str]]:
+    """Blocks of every armor family, from 1m up"""
+    families = {}
+    for child, parent in ARMOR_BLOCK_FAMILIES.items():
+        families.setdefault(parent, []).append(child)
+    return families
+
+
+def armor_guid_map():
+    """Item definitions of every armor block and of a 1m decoration"""
+    guid_map = {
+        guid: item(guid, length)
+        for children in armor_families().values()
+        for length, guid in enumerate(children, 1)
+    }
+    guid_map[DECORATION_GUID] = item(DECORATION_GUID)
+    return guid_map
+
+
+def hull(width=8, seed=0, colors=2, holes=0.05) -> VoxelField:
+    """Hollow box, two voxels thick, with random holes in it and random colors.
+    Values are 1 + color."""
+    rng = np.random.default_rng(seed)
+    shape = (width, width // 2 + 2, 3 * width)
+    occupied = np.ones(shape, dtype=bool)
+    occupied[2:-2, 2:-2, 2:-2] = False
+    occupied &= rng.random(shape) >= holes
+    return VoxelField.from_dense(
+        np.where(occupied, 1 + rng.integers(0, colors, shape), 0)
+    )
+
+
+def mirrored(field: VoxelField) -> VoxelField:
+    """`field` with its right half replaced by the mirror image of its left"""
+    dense = field.to_dense()
+    x = np.arange(dense.shape[0])[:, None, None]
+    return VoxelField.from_dense(np.where(2 * x < dense.shape[0], dense, dense[::-1]))
+
+
+def write_blueprint(path: Path, field: VoxelField, seed=0, decorations=0.02, nulls=0.0):
+    """Blueprint of 1m blocks at the voxels of `field`, of two armor families
+    and colored by its values, with some decorations mixed in. A `nulls` share
+    of blocks have null rotations and colors."""
+    rng = np.random.default_rng(seed)
+    first, second = [children[0] for children in armor_families().values()][:2]
+    coords = field.coords[field.values != 0]
+    colors = field.values[field.values != 0] - 1
+
+    block_ids = np.where(rng.random(len(coords)) < 0.5, 1, 2)
+    block_ids[rng.random(len(coords)) < decorations] = 3
+    null = rng.random(len(coords)) < nulls
+
+    low, high = coords.min(axis=0), coords.max(axis=0)
+    bp = {
+        "Name": "test",
+        "ItemDictionary": {"1": first, "2": second, "3": DECORATION_GUID},
+        "Blueprint": {
+            "MaxCords": ",".join(map(str, high.tolist())),
+            "MinCords": ",".join(map(str, low.tolist())),
+            "BLP": [f"{x},{y},{z}" for x, y, z in coords.tolist()],
+            "BLR": np.where(null, None, 0).tolist(),
+            "BCI": np.where(null, None, colors).tolist(),
+            "BlockIds": block_ids.tolist(),
+            "COL": ["0,0,0,1"],
+            "SCs": [],
+        },
+    }
+    path.write_text(json.dumps(bp))
+    return bp
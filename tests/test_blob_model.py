@@ -0,0 +1,81 @@
+from scipy.optimize import Bounds, LinearConstraint
+from scipy.sparse import coo_array
+
+import numpy as np
+
+from src.beamification import build_blob_model
+
+
+def reference_blob_model(blob):
+    """The model as it was built voxel by voxel, before `build_blob_model`"""
+    coords_set = {tuple(coord): i for i, coord in enumerate(blob.tolist())}
+    size = len(blob)
+
+    configuration_coords = []
+    boundaries = []
+    for i, (x, y, z) in enumerate(blob.tolist()):
+        added = [(i, 10 * i)]
+        boundaries.append(True)
+
+        # Beam acceptance tests
+        for axis, step in enumerate(np.eye(3, dtype=int).tolist()):
+            fits = True
+            for offset in range(1, 4):
+                ahead = (
+                    x + offset * step[0],
+                    y + offset * step[1],
+                    z + offset * step[2],
+                )
+                fits = fits and ahead in coords_set
+                boundaries.append(fits)
+                if fits:
+                    added.append((i, 10 * i + 3 * axis + offset))
+
+        # Cover tests
+        for axis, step in enumerate(np.eye(3, dtype=int).tolist()):
+            for offset in range(1, 4):
+                behind = (
+                    x - offset * step[0],
+                    y - offset * step[1],
+                    z - offset * step[2],
+                )
+                if (j := coords_set.get(behind)) is not None:
+                    for configuration in range(3 * axis + offset, 3 * axis + 4):
+                        added.append((i, 10 * j + configuration))
+
+        configuration_coords.extend(added)
+
+    bounds = Bounds(0, boundaries)  # type: ignore
+    constraint = LinearConstraint(
+        coo_array(
+            (np.ones(len(configuration_coords)), np.array(configuration_coords).T),
+            (size, 10 * size),
+        ),
+        1,
+        1,
+    )
+    return bounds, constraint
+
+
+def random_blob(rng: np.random.Generator):
+    shape = rng.integers(1, 8, size=3)
+    occupied = rng.random(shape) < rng.uniform(0.3, 1.0)
+    occupied.flat[0] = True
+    return np.argwhere(occupied)
+
+
+def test_build_blob_model_matches_reference():
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        blob = random_blob(rng)
+
+        bounds, constraint = build_blob_model(blob)
+        expected_bounds, expected_constraint = reference_blob_model(blob)
+
+        np.testing.assert_array_equal(
+            np.asarray(bounds.ub, dtype=bool),
+            np.asarray(expected_bounds.ub, dtype=bool),
+        )
+        np.testing.assert_array_equal(
+            constraint.A.toarray(), expected_constraint.A.toarray()
+        )
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+import json
+
+import numpy as np
+
+from src.beamification import beamify
+from src.blueprint import load_blueprint
+from src.field_cache import prepare_blueprint
+from src.make_result import JSON_ENCODER, make_bp_from_field
+
+from synthetic import armor_guid_map, hull, write_blueprint
+
+
+def test_columns_read_back_as_written(tmp_path: Path):
+    bp_path = tmp_path / "craft.blueprint"
+    bp = write_blueprint(bp_path, hull(6, seed=0), nulls=0.2)
+    # Subconstructs have columns of their own
+    bp["Blueprint"]["SCs"] = [{**bp["Blueprint"], "SCs": []}]
+    bp_path.write_text(json.dumps(bp))
+
+    loaded = load_blueprint(bp_path)
+
+    assert np.ma.is_masked(loaded["Blueprint"]["BCI"])
+    assert np.ma.is_masked(loaded["Blueprint"]["SCs"][0]["BLR"])
+    assert json.loads(JSON_ENCODER.encode(loaded)) == bp
+
+
+def test_beamified_blueprint_keeps_untouched_blocks(tmp_path: Path):
+    guid_map = armor_guid_map()
+    bp_path = tmp_path / "craft.blueprint"
+    og_columns = write_blueprint(bp_path, hull(8, seed=1), nulls=0.1)["Blueprint"]
+    bp, blocks, _, s_field, _ = prepare_blueprint(bp_path, guid_map, use_cache=False)
+
+    beamified_path = tmp_path / "beamified.blueprint"
+    with beamified_path.open("w") as output:
+        make_bp_from_field(
+            beamify(s_field, grain_directions="zxy"), guid_map, blocks, bp, output
+        )
+    columns = json.loads(beamified_path.read_text())["Blueprint"]
+
+    rows = len(og_columns["BLP"])
+    for column in ("BLR", "BCI", "BlockIds"):
+        assert columns[column][:rows] == og_columns[column]
+        assert None not in columns[column][rows:]
+    beams = len(columns["BLP"]) - rows
+    assert 0 < beams < np.count_nonzero(s_field.values)
+    # The beamified blueprint can be read back itself
+    prepare_blueprint(beamified_path, guid_map, use_cache=False)
@@ -0,0 +1,44 @@
+import numpy as np
+
+from src import beamification
+from src.beamification import beamify, grain_coefficients, layout_objective
+from src.explore import explore_beamify
+
+from layout_checks import assert_valid_layout
+from synthetic import hull
+
+
+VARIANTS = [("zxy", "random"), ("xyz", "sided")]
+
+
+def test_explore_matches_beamify_for_every_variant():
+    s_field = hull(8, seed=0)
+
+    layouts = explore_beamify(s_field, variants=VARIANTS)
+
+    for (grain, bias), layout in layouts.items():
+        assert_valid_layout(s_field, layout)
+        coeffs = grain_coefficients(grain)
+        assert layout_objective(s_field, layout, coeffs, bias) == layout_objective(
+            s_field,
+            beamify(s_field, grain_directions=grain, bias_type=bias),
+            coeffs,
+            bias,
+        )
+
+
+def test_explore_splits_blobs_without_a_layout(monkeypatch):
+    s_field = hull(8, seed=1)
+    solve_model = beamification.solve_model
+
+    def failing_big_solves(objective, bounds, constraint, *args, **kwargs):
+        if constraint.A.shape[0] > 100:
+            return False, None, np.inf, 0.0
+        return solve_model(objective, bounds, constraint, *args, **kwargs)
+
+    monkeypatch.setattr(beamification, "solve_model", failing_big_solves)
+
+    layouts = explore_beamify(s_field, variants=VARIANTS, blob_size_threshold=300)
+
+    for layout in layouts.values():
+        assert_valid_layout(s_field, layout)
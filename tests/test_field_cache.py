@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from src.field_cache import prepare_blueprint
+from src.make_result import encode_array
+
+from synthetic import armor_guid_map, hull, write_blueprint
+
+
+REPO_ROOT = Path(__file__).parent.parent
+
+# Prepares a blueprint through the field cache, and reports whether it came from
+# the cache and whether it matches the blueprint prepared from scratch
+PREPARE_TWICE = """
+import json, sys
+from pathlib import Path
+
+sys.path.insert(0, "tests")
+from src.field_cache import prepare_blueprint
+from synthetic import armor_guid_map
+
+timings = {}
+_, _, _, s_field, segments = prepare_blueprint(
+    Path(sys.argv[1]), armor_guid_map(), timings=timings
+)
+_, _, _, fresh_field, fresh_segments = prepare_blueprint(
+    Path(sys.argv[1]), armor_guid_map(), use_cache=False
+)
+print(
+    json.dumps(
+        {
+            "cached": "blueprint parse" not in timings,
+            "same_field": bool((s_field.values == fresh_field.values).all()),
+            "same_segments": sorted(segments) == sorted(fresh_segments),
+        }
+    )
+)
+"""
+
+
+def prepare_in_process(bp_path: Path, cache_home: Path, hash_seed: int):
+    env = {
+        **os.environ,
+        "XDG_CACHE_HOME": str(cache_home),
+        "PYTHONHASHSEED": str(hash_seed),
+    }
+    completed = subprocess.run(
+        [sys.executable, "-c", PREPARE_TWICE, str(bp_path)],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def test_field_cache_is_read_back_the_same_across_processes(tmp_path):
+    bp_path = tmp_path / "craft.blueprint"
+    write_blueprint(bp_path, hull(seed=1, colors=3))
+
+    stored = prepare_in_process(bp_path, tmp_path / "cache", hash_seed=1)
+    assert not stored["cached"]
+
+    for hash_seed in (2, 3):
+        loaded = prepare_in_process(bp_path, tmp_path / "cache", hash_seed)
+        assert loaded == {"cached": True, "same_field": True, "same_segments": True}
+
+
+def test_field_cache_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    bp_path = tmp_path / "craft.blueprint"
+    write_blueprint(bp_path, hull(seed=2), nulls=0.1)
+    guid_map = armor_guid_map()
+
+    stored = prepare_blueprint(bp_path, guid_map)
+    timings = {}
+    loaded = prepare_blueprint(bp_path, guid_map, timings=timings)
+    assert "blueprint parse" not in timings
+
+    bp, blocks, color_map, s_field, segments = stored
+    loaded_bp, loaded_blocks, loaded_color_map, loaded_field, loaded_segments = loaded
+    # Nulls are kept too
+    assert json.dumps(loaded_bp, default=encode_array) == json.dumps(
+        bp, default=encode_array
+    )
+    assert loaded_blocks.guids == blocks.guids
+    np.testing.assert_array_equal(loaded_blocks.coords, blocks.coords)
+    np.testing.assert_array_equal(loaded_blocks.guid_index, blocks.guid_index)
+    np.testing.assert_array_equal(loaded_color_map, color_map)
+    np.testing.assert_array_equal(loaded_field.keys, s_field.keys)
+    np.testing.assert_array_equal(loaded_field.values, s_field.values)
+    assert loaded_field.origin == s_field.origin
+    assert sorted(loaded_segments) == sorted(segments)
+    for segment_id, voxels in segments.items():
+        np.testing.assert_array_equal(loaded_segments[segment_id], voxels)
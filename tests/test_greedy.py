@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.beamification import beamify, grain_coefficients, layout_objective
+from src.greedy import greedy_beamify
+from src.voxel_field import VoxelField
+
+from layout_checks import assert_valid_layout
+from synthetic import hull
+
+
+@pytest.mark.parametrize("grain", ["zxy", "xzy"])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_greedy_layout_is_valid_and_no_better_than_milp(grain, seed):
+    s_field = hull(8, seed=seed, holes=0.1)
+
+    layout = greedy_beamify(s_field, grain_directions=grain)
+
+    assert_valid_layout(s_field, layout)
+    coeffs = grain_coefficients(grain)
+    milp_objective = layout_objective(
+        s_field, beamify(s_field, grain_directions=grain), coeffs
+    )
+    assert layout_objective(s_field, layout, coeffs) >= milp_objective - 1e-9
+
+
+@pytest.mark.parametrize("length", range(2, 13))
+def test_straight_runs_get_no_single_blocks(length):
+    s_field = VoxelField.from_dense(np.ones((1, 1, length), dtype=np.int64))
+
+    layout = greedy_beamify(s_field)
+
+    assert_valid_layout(s_field, layout)
+    assert np.all(np.bincount(layout.values)[1:] >= 2)
+
+
+def test_leftovers_join_neighbouring_beams():
+    # Two rows of 5 along Z, and a third holding only their end voxels
+    dense = np.zeros((3, 1, 5), dtype=np.int64)
+    dense[:2] = 1
+    dense[2, 0, 0] = dense[2, 0, 4] = 1
+    s_field = VoxelField.from_dense(dense)
+
+    layout = greedy_beamify(s_field)
+
+    assert_valid_layout(s_field, layout)
+    assert np.all(np.bincount(layout.values)[1:] >= 2)
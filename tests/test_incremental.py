@@ -0,0 +1,67 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.beamification import beamify
+from src.field_cache import prepare_blueprint
+from src.incremental import REBEAMIFY_MARGIN, block_layout, carry_over_beams, rebeamify
+from src.make_result import make_bp_from_field
+
+from layout_checks import assert_valid_layout
+from synthetic import armor_guid_map, hull, write_blueprint
+
+
+@pytest.fixture
+def beamified_craft(tmp_path: Path):
+    """Blueprint of a craft, its s_field, and the s_field and beam layout of the
+    blueprint beamified from it"""
+    guid_map = armor_guid_map()
+    bp_path = tmp_path / "craft.blueprint"
+    write_blueprint(bp_path, hull(8, seed=0))
+    bp, blocks, _, s_field, _ = prepare_blueprint(bp_path, guid_map, use_cache=False)
+
+    beamified_path = tmp_path / "beamified.blueprint"
+    with beamified_path.open("w") as output:
+        make_bp_from_field(
+            beamify(s_field, grain_directions="zxy"), guid_map, blocks, bp, output
+        )
+    _, previous_blocks, _, previous_field, _ = prepare_blueprint(
+        beamified_path, guid_map, use_cache=False
+    )
+    return s_field, previous_field, block_layout(previous_blocks, previous_field)
+
+
+def test_unchanged_craft_keeps_every_beam(beamified_craft):
+    s_field, previous_field, previous_layout = beamified_craft
+
+    carried = carry_over_beams(s_field, previous_field, previous_layout)
+    assert np.count_nonzero(carried.values) == np.count_nonzero(s_field.values)
+
+    def solve(rest):
+        raise AssertionError("nothing is left to solve")
+
+    layout = rebeamify(s_field, previous_field, previous_layout, solve)
+    assert_valid_layout(s_field, layout)
+
+
+def test_changed_craft_resolves_around_changes(beamified_craft):
+    s_field, previous_field, previous_layout = beamified_craft
+    s_field = s_field.copy()
+    occupied = np.flatnonzero(s_field.values)
+    changed = occupied[len(occupied) // 2]
+    s_field.values[changed] = 0
+
+    solved = []
+
+    def solve(rest):
+        solved.append(np.count_nonzero(rest.values))
+        return beamify(rest, grain_directions="zxy")
+
+    layout = rebeamify(s_field, previous_field, previous_layout, solve)
+
+    assert_valid_layout(s_field, layout)
+    # Only beams near the change are solved again
+    reach = 2 * REBEAMIFY_MARGIN + 4
+    assert 0 < solved[0] <= (2 * reach + 1) ** 3
+    assert solved[0] < np.count_nonzero(s_field.values) // 2
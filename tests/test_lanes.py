@@ -0,0 +1,76 @@
+from itertools import product
+
+import numpy as np
+import pytest
+
+from src.beamification import beamify, grain_coefficients
+from src.lanes import solve_lanes, tile_runs
+
+from layout_checks import assert_valid_layout
+from synthetic import hull
+
+
+def cheapest_tiling_cost(costs: np.ndarray) -> float:
+    """Cost of the cheapest tiling of one run, trying every tiling"""
+    best = np.inf
+    for pieces in range(1, len(costs) + 1):
+        for lengths in product(range(1, 5), repeat=pieces):
+            if sum(lengths) != len(costs):
+                continue
+            starts = np.cumsum(lengths) - lengths
+            best = min(best, sum(costs[s, l - 1] for s, l in zip(starts, lengths)))
+    return best
+
+
+def test_runs_are_tiled_at_their_cheapest():
+    rng = np.random.default_rng(0)
+    run_lengths = np.array([1, 2, 3, 4, 5, 6, 7, 8])
+    positions = np.concatenate([np.arange(length) for length in run_lengths])
+    piece_costs = rng.normal(size=(len(positions), 4))
+
+    piece_starts, piece_lengths = tile_runs(piece_costs, positions, run_lengths)
+
+    covered = np.concatenate(
+        [
+            np.arange(start, start + length)
+            for start, length in zip(piece_starts, piece_lengths)
+        ]
+    )
+    np.testing.assert_array_equal(np.sort(covered), np.arange(len(positions)))
+    run_starts = np.cumsum(run_lengths) - run_lengths
+    for start, length in zip(run_starts, run_lengths):
+        in_run = (piece_starts >= start) & (piece_starts < start + length)
+        assert np.all(piece_starts[in_run] + piece_lengths[in_run] <= start + length)
+        assert piece_costs[
+            piece_starts[in_run], piece_lengths[in_run] - 1
+        ].sum() == pytest.approx(
+            cheapest_tiling_cost(piece_costs[start : start + length])
+        )
+
+
+@pytest.mark.parametrize("grain", ["zxy", "xzy"])
+def test_settled_lanes_are_beams_along_the_grain(grain):
+    s_field = hull(8, seed=0, holes=0.1)
+    axis = "xyz".index(grain[0])
+
+    settled = solve_lanes(s_field, tuple(grain_coefficients(grain)), axis)
+
+    assert np.count_nonzero(settled.values)
+    assert np.all(s_field.values[settled.values != 0] != 0)
+    coords = settled.coords
+    for label, voxels in settled.value_indices().items():
+        if label == 0:
+            continue
+        assert len(np.unique(s_field.values[voxels])) == 1
+        extents = np.ptp(coords[voxels], axis=0)
+        assert 2 <= len(voxels) <= 4
+        assert extents[axis] == len(voxels) - 1
+        assert np.count_nonzero(extents) == 1
+
+
+def test_beamify_with_lanes_covers_the_craft():
+    s_field = hull(8, seed=1, holes=0.1)
+
+    layout = beamify(s_field, grain_directions="zxy", lanes=True)
+
+    assert_valid_layout(s_field, layout)
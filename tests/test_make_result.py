@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import json
+
+import numpy as np
+
+from src.beamification import beamify
+from src.field_cache import prepare_blueprint
+from src.make_result import AXIS_ROTATIONS, make_bp_from_field
+from src.s_field import ARMOR_BLOCK_FAMILIES
+
+from synthetic import DECORATION_GUID, armor_guid_map, hull, write_blueprint
+
+
+def test_beams_replace_exactly_the_armor_they_cover(tmp_path: Path):
+    guid_map = armor_guid_map()
+    bp_path = tmp_path / "craft.blueprint"
+    og_bp = write_blueprint(bp_path, hull(8, seed=3), decorations=0.05)
+    bp, blocks, _, s_field, _ = prepare_blueprint(bp_path, guid_map, use_cache=False)
+
+    beamified_path = tmp_path / "beamified.blueprint"
+    with beamified_path.open("w") as output:
+        make_bp_from_field(
+            beamify(s_field, grain_directions="zxy"), guid_map, blocks, bp, output
+        )
+    beamified = json.loads(beamified_path.read_text())
+
+    og_columns = og_bp["Blueprint"]
+    columns = beamified["Blueprint"]
+    rows = len(og_columns["BLP"])
+    og_coords = np.array([[*map(int, p.split(","))] for p in og_columns["BLP"]])
+    coords = np.array([[*map(int, p.split(","))] for p in columns["BLP"]])
+    guids = [beamified["ItemDictionary"][str(i)] for i in columns["BlockIds"]]
+    og_guids = [og_bp["ItemDictionary"][str(i)] for i in og_columns["BlockIds"]]
+
+    # Armor is moved out of the way, decorations stay where they are
+    is_decoration = np.array([guid == DECORATION_GUID for guid in og_guids])
+    moved = np.any(coords[:rows] != og_coords, axis=1)
+    np.testing.assert_array_equal(moved, ~is_decoration)
+    assert np.all(coords[:rows][moved, 1] > og_coords[:, 1].max())
+
+    # Beams cover every armor voxel once, each of the family it replaces
+    family_at = {
+        tuple(coord): ARMOR_BLOCK_FAMILIES[guid]
+        for coord, guid in zip(og_coords.tolist(), og_guids)
+        if guid != DECORATION_GUID
+    }
+    covered = []
+    for origin, rotation, guid in zip(
+        coords[rows:], columns["BLR"][rows:], guids[rows:]
+    ):
+        length = guid_map[guid]["SizeInfo"]["SizePos"]["z"] + 1
+        axis = np.flatnonzero(AXIS_ROTATIONS == rotation)[0] if length > 1 else 2
+        for step in range(length):
+            voxel = origin.copy()
+            voxel[axis] += step
+            assert family_at[tuple(voxel)] == ARMOR_BLOCK_FAMILIES[guid]
+            covered.append(tuple(voxel))
+    assert sorted(covered) == sorted(family_at)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from src import beamification
+from src.beamification import (
+    STITCH_BAND_WIDTH,
+    beamify_procedure,
+    grain_coefficients,
+    partition_blob,
+)
+
+from layout_checks import assert_valid_layout
+from synthetic import hull
+
+
+@pytest.mark.parametrize("max_size", [1, 50, 400])
+def test_partition_blob_covers_points_in_bounded_blobs(max_size):
+    points = hull(10, seed=0).coords
+
+    blobs, cuts = partition_blob(points, max_size, grain_axis=2)
+
+    assert all(1 <= len(blob) <= max_size for blob in blobs)
+    covered = np.concatenate(blobs)
+    assert len(covered) == len(points)
+    np.testing.assert_array_equal(np.unique(covered, axis=0), np.unique(points, axis=0))
+
+    for depth, band in cuts:
+        assert depth >= 0
+        assert len(band)
+        # Bands hug their cut, so they are thin along at least one axis
+        assert np.ptp(band, axis=0).min() < 2 * STITCH_BAND_WIDTH
+
+
+def test_partition_blob_is_deterministic():
+    points = hull(10, seed=1).coords
+    shuffled = points[np.random.default_rng(0).permutation(len(points))]
+
+    blobs, _ = partition_blob(points, 100, grain_axis=2)
+    shuffled_blobs, _ = partition_blob(shuffled, 100, grain_axis=2)
+
+    assert [len(blob) for blob in blobs] == [len(blob) for blob in shuffled_blobs]
+    for blob, shuffled_blob in zip(blobs, shuffled_blobs):
+        np.testing.assert_array_equal(
+            np.unique(blob, axis=0), np.unique(shuffled_blob, axis=0)
+        )
+
+
+@pytest.mark.parametrize("blob_size_threshold", [40, 150])
+def test_partitioned_solves_stay_within_threshold(monkeypatch, blob_size_threshold):
+    s_field = hull(10, seed=2, colors=1)
+    solved_sizes = []
+    solve_blobs = beamification.solve_blobs
+
+    def recording_solve_blobs(blobs, *args, **kwargs):
+        solved_sizes.extend(len(blob) for blob in blobs)
+        return solve_blobs(blobs, *args, **kwargs)
+
+    monkeypatch.setattr(beamification, "solve_blobs", recording_solve_blobs)
+
+    layout = beamify_procedure(
+        s_field,
+        tuple(grain_coefficients("zxy")),
+        blob_size_threshold=blob_size_threshold,
+    )
+
+    assert_valid_layout(s_field, layout)
+    assert max(solved_sizes) <= blob_size_threshold
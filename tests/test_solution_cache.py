@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from src import beamification
+from src.beamification import grain_coefficients, solve_blobs
+from src.coefficients import blob_coefficients
+from src.solution_cache import SolutionCache
+
+from synthetic import hull
+
+
+FIELD_SHAPE = (40, 40, 40)
+
+
+@pytest.fixture
+def solved_blobs(tmp_path, monkeypatch):
+    """Sizes of the blobs that went to the solver, with the user cache directory
+    moved to a temporary one"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    sizes = []
+    solve_scheduled_blobs = beamification.solve_scheduled_blobs
+
+    def recording_solve_scheduled_blobs(blobs, *args, **kwargs):
+        sizes.extend(len(blob) for blob in blobs)
+        return solve_scheduled_blobs(blobs, *args, **kwargs)
+
+    monkeypatch.setattr(
+        beamification, "solve_scheduled_blobs", recording_solve_scheduled_blobs
+    )
+    return sizes
+
+
+def blob_of(seed: int):
+    field = hull(4, seed=seed, holes=0.2)
+    return field.coords[field.values != 0]
+
+
+def solve_once(blob, bias_type="random"):
+    """Objective and layout of `blob` solved through a freshly opened cache"""
+    coeffs = tuple(grain_coefficients("zxy"))
+    solution_cache = SolutionCache()
+    try:
+        ((optimal, chosen, _, _),) = solve_blobs(
+            [blob],
+            solution_cache=solution_cache,
+            coeffs=coeffs,
+            field_shape=FIELD_SHAPE,
+            bias_type=bias_type,
+        )
+    finally:
+        solution_cache.close()
+    assert optimal
+    return blob_coefficients(blob, coeffs, FIELD_SHAPE, bias_type)[chosen].sum(), chosen
+
+
+def test_moved_blob_reuses_layout(solved_blobs):
+    blob = blob_of(0)
+    objective, chosen = solve_once(blob)
+    assert solved_blobs == [len(blob)]
+
+    # Same shape elsewhere, with its voxels in another order
+    order = np.random.default_rng(0).permutation(len(blob))
+    moved_objective, moved_chosen = solve_once(blob[order] + (5, 3, 7))
+
+    assert solved_blobs == [len(blob)]
+    assert moved_objective == pytest.approx(objective)
+    # Beams start at the same voxels, in the same configurations
+    np.testing.assert_array_equal(
+        np.sort(10 * order[moved_chosen // 10] + moved_chosen % 10), np.sort(chosen)
+    )
+
+
+@pytest.mark.parametrize("bias_type", ["sided", "alternate"])
+def test_positional_bias_reuses_layout_in_place_only(solved_blobs, bias_type):
+    blob = blob_of(1)
+    solve_once(blob, bias_type)
+    solve_once(blob, bias_type)
+    assert solved_blobs == [len(blob)]
+
+    solve_once(blob + (1, 0, 0), bias_type)
+    assert solved_blobs == [len(blob)] * 2
+
+
+def test_least_recently_used_layouts_are_evicted(solved_blobs):
+    blobs = [blob_of(seed) for seed in range(3)]
+    for blob in blobs:
+        solve_once(blob)
+
+    # Reading the first blob makes the second the least recently used
+    solve_once(blobs[0])
+    solution_cache = SolutionCache()
+    (size,) = solution_cache.connection.execute(
+        "SELECT SUM(LENGTH(chosen)) FROM solutions"
+    ).fetchone()
+    solution_cache.max_size = size - 1
+    solution_cache.close()
+
+    for blob in blobs:
+        solve_once(blob)
+    assert solved_blobs == [len(blob) for blob in blobs] + [len(blobs[1])]
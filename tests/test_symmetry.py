@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from src.beamification import beamify
+from src.symmetry import find_mirror, symmetric_beamify
+
+from layout_checks import assert_mirror_symmetric, assert_valid_layout
+from synthetic import hull, mirrored
+
+
+@pytest.mark.parametrize("width", [8, 9])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_symmetric_craft_gets_symmetric_layout(width, seed):
+    s_field = mirrored(hull(width, seed=seed, holes=0.1))
+    plane, mirror, symmetric = find_mirror(s_field)
+    assert np.all(symmetric[s_field.values != 0])
+
+    layout = symmetric_beamify(s_field, grain_directions="xzy")
+
+    assert_valid_layout(s_field, layout)
+    assert_mirror_symmetric(layout, mirror)
+
+
+def test_asymmetric_craft_is_beamified_whole():
+    s_field = hull(9, seed=3, holes=0.2)
+
+    layout = symmetric_beamify(s_field, grain_directions="zxy")
+
+    assert_valid_layout(s_field, layout)
+    np.testing.assert_array_equal(
+        layout.values, beamify(s_field, grain_directions="zxy").values
+    )
+
+
+def test_voxels_without_mirror_image_are_covered():
+    s_field = mirrored(hull(9, seed=4))
+    occupied = np.flatnonzero(s_field.values != 0)
+    # A few stray voxels keep the craft above the symmetry threshold
+    s_field.values[occupied[:: len(occupied) // 10][:5]] = 0
+
+    layout = symmetric_beamify(s_field, grain_directions="zxy")
+
+    assert_valid_layout(s_field, layout)